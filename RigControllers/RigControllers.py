@@ -1,19 +1,51 @@
+import json
+import math
+import time
+
 import pymel.core as pm
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
 from PySide6 import QtWidgets, QtCore
 
+# The undo plugin sits next to this file, it can't be found when this file is pasted in the script editor
+try:
+    import RigControllersUndo
+except ImportError:
+    RigControllersUndo = None
+
 # Global vars - UI
 ctrlWindow = None
 jointField = None
 radiusSlider = None
 prefixOption = None
+constraintOption = None
+shapeOption = None
+sharedShapeCheckBox = None
+
+# Ways a controller can drive its joint, as shown in the window
+constraintModes = {"Orient constraint": "orient", "Matrix": "matrix"}
 
 def LoadSelectedJoint():
     selection = pm.ls(selection=True, type='joint')
     if selection:
         jointField.setText(selection[0].name())
       
+''' Constraint mode picked in the window, orient when there is no window '''
+def ConstraintMode(constraintMode=None):
+    if constraintMode is None:
+        return constraintModes[constraintOption.currentText()] if constraintOption else "orient"
+    return constraintMode
+
+''' Shape and shared shape option picked in the window, a circle of its own when there is no window '''
+def ShapeOptions(shape=None, sharedShape=None):
+    if shape is None:
+        shape = shapeOption.currentText() if shapeOption else "circle"
+    if sharedShape is None:
+        sharedShape = sharedShapeCheckBox.isChecked() if sharedShapeCheckBox else False
+    return shape, sharedShape
+      
 ''' Create a single controller at selected joint '''        
-def CreateController():
+def CreateController(constraintMode=None, shape=None):
     # Get joint name and apply chosen radius and prefix
     jointName = jointField.text()
     radius = radiusSlider.value()
@@ -29,7 +61,7 @@ def CreateController():
     finalGrpName = finalCtrlName.replace("_CTRL", "_GRP")
     
     # Create controller
-    ctrl = pm.circle(normal=(1, 0, 0), radius=radius, ch=False)[0]
+    ctrl = CreateControllerCurve(ShapeOptions(shape)[0], radius)
     
     # Match pos and rotation
     ctrl.setMatrix(joint.getMatrix(worldSpace=True))
@@ -38,13 +70,16 @@ def CreateController():
     offsetGrp = pm.group(ctrl, name=finalGrpName)
     ctrl.rename(finalCtrlName)
     
-     pm.orientConstraint(ctrl, joint, mo=True)
+    ConstrainJoint(ctrl.longName(), joint.longName(), ConstraintMode(constraintMode))
         
     print(f"Controller created for {jointName}")
 
 
-''' Create multiple controllers in a chain for selected root joint '''    
-def CreateControllerChain():
+''' Create multiple controllers in a chain for selected root joint.
+The joints are walked once, parents before children, and every controller group is parented
+under the controller of its own parent joint, so branching skeletons keep their hierarchy.
+Returns the joint to controller map. '''    
+def CreateControllerChain(breadthFirst=False, constraintMode=None, shape=None, sharedShape=None):
     # Get joint name and apply chosen radius and prefix
     jointName = jointField.text()
     radius = radiusSlider.value()
@@ -52,38 +87,668 @@ def CreateControllerChain():
     
     if not pm.objExists(jointName):
         pm.warning(f"Joint {jointName} does not exist")
-        return
+        return {}
     
-    joint = pm.PyNode(jointName)
+    # Root joint included, every joint comes after its parent
+    paths, parents = ReadJointHierarchy(GetDagPath(jointName), breadthFirst)
     
-    # Include root joint and sort so the hierarchy is set correctly
-    jointChain = sorted([joint] + joint.listRelatives(ad=True, type='joint'))
+    # Controller of every joint so far, by full joint path
+    ctrlByJoint = {}
+    constraintMode = ConstraintMode(constraintMode)
+    shape, sharedShape = ShapeOptions(shape, sharedShape)
     
-    previousCtrl = None
+    # With shared shapes, the first controller's shape is instanced under all the others
+    firstShape = None
     
-    for j in jointChain:
-        baseName = j.nodeName().replace("joint", "ctrl")
-        finalCtrlName = f"{prefix}{baseName}_CTRL" if prefix != "None" else f"{baseName}_CTRL"
-        finalGrpName = finalCtrlName.replace("_CTRL", "_GRP")
+    for path, parentIndex in zip(paths, parents):
+        j = pm.PyNode(path.fullPathName())
+        finalCtrlName, finalGrpName = ControllerNames(j.nodeName(), prefix)
 
         # Create controller
-        ctrl = pm.circle(normal=(1, 0, 0), radius=radius, ch=False)[0]
+        ctrl = CreateControllerCurve(shape, radius, firstShape)
+        if sharedShape and firstShape is None:
+            firstShape = ctrl.getShape()
         ctrl.setMatrix(j.getMatrix(worldSpace=True))
         ctrl.rename(finalCtrlName)
 
         # Create group for controller
         offsetGrp = pm.group(ctrl, name=finalGrpName)
         
-        if previousCtrl:
-            # Parent this group under the previous controller
-            pm.parent(offsetGrp, previousCtrl)
+        if parentIndex >= 0:
+            # Parent this group under the controller of the parent joint
+            pm.parent(offsetGrp, ctrlByJoint[paths[parentIndex].fullPathName()])
 
-        previousCtrl = ctrl
+        ctrlByJoint[path.fullPathName()] = ctrl
         
-        pm.orientConstraint(ctrl, j, mo=True)
+        ConstrainJoint(ctrl.longName(), path.fullPathName(), constraintMode)
         
+    # Store the setup with the rig, so it can be rebuilt later
+    spec = ControllerSpec(jointName, radius, prefix, constraintMode, shape, sharedShape)
+    TagControllers(spec, [ctrlByJoint[path.fullPathName()].longName() for path in paths], paths, parents)
 
     print(f"Controller chain created starting from {jointName}")
+    return ctrlByJoint
+
+
+''' MATRIX CONSTRAINTS
+Drives the rotation of a joint from its controller with a multMatrix into a decomposeMatrix,
+instead of an orientConstraint. The multMatrix takes the offset between the joint and the controller
+(worked out once when the rig is built), the world matrix of the controller, the parent inverse of the
+joint and the inverse of its joint orient, which leaves exactly the rotate values of the joint.
+The result is the same as an orientConstraint with maintain offset, with plain matrix nodes that
+evaluate a lot cheaper than constraint nodes. '''
+
+''' Static matrices of a matrix constraint: the offset from the controller to the joint
+and the inverse of the joint orient '''
+def MatrixConstraintOffsets(jointName, jointWorld, ctrlWorld):
+    offset = jointWorld * ctrlWorld.inverse()
+    
+    orient = cmds.getAttr(jointName + ".jointOrient")[0]
+    orientInverse = om.MEulerRotation([math.radians(angle) for angle in orient]).asMatrix().inverse()
+    return offset, orientInverse
+
+''' Drive a joint from a controller with the given constraint mode, "orient" or "matrix" '''
+def ConstrainJoint(ctrlName, jointName, constraintMode="orient"):
+    if constraintMode != "matrix":
+        cmds.orientConstraint(ctrlName, jointName, maintainOffset=True)
+        return
+    
+    offset, orientInverse = MatrixConstraintOffsets(jointName, GetDagPath(jointName).inclusiveMatrix(),
+                                                    GetDagPath(ctrlName).inclusiveMatrix())
+    
+    multNode = cmds.createNode("multMatrix", name=jointName.split("|")[-1] + "_multMatrix")
+    decomposeNode = cmds.createNode("decomposeMatrix", name=jointName.split("|")[-1] + "_decomposeMatrix")
+    
+    cmds.setAttr(multNode + ".matrixIn[0]", list(offset), type="matrix")
+    cmds.connectAttr(ctrlName + ".worldMatrix[0]", multNode + ".matrixIn[1]")
+    cmds.connectAttr(jointName + ".parentInverseMatrix[0]", multNode + ".matrixIn[2]")
+    cmds.setAttr(multNode + ".matrixIn[3]", list(orientInverse), type="matrix")
+    
+    cmds.connectAttr(multNode + ".matrixSum", decomposeNode + ".inputMatrix")
+    cmds.connectAttr(jointName + ".rotateOrder", decomposeNode + ".inputRotateOrder")
+    cmds.connectAttr(decomposeNode + ".outputRotate", jointName + ".rotate", force=True)
+
+''' The same matrix constraint, with every node and connection added to a modifier '''
+def AddMatrixConstraint(modifier, ctrl, jointPath, offset, orientInverse):
+    multNode = modifier.createNode("multMatrix")
+    decomposeNode = modifier.createNode("decomposeMatrix")
+    
+    multFn = om.MFnDependencyNode(multNode)
+    decomposeFn = om.MFnDependencyNode(decomposeNode)
+    jointFn = om.MFnDependencyNode(jointPath.node())
+    matrixIn = multFn.findPlug("matrixIn", False)
+    
+    modifier.newPlugValue(matrixIn.elementByLogicalIndex(0), om.MFnMatrixData().create(offset))
+    modifier.connect(om.MFnDependencyNode(ctrl).findPlug("worldMatrix", False).elementByLogicalIndex(0),
+                     matrixIn.elementByLogicalIndex(1))
+    modifier.connect(jointFn.findPlug("parentInverseMatrix", False).elementByLogicalIndex(0), matrixIn.elementByLogicalIndex(2))
+    modifier.newPlugValue(matrixIn.elementByLogicalIndex(3), om.MFnMatrixData().create(orientInverse))
+    
+    modifier.connect(multFn.findPlug("matrixSum", False), decomposeFn.findPlug("inputMatrix", False))
+    modifier.connect(jointFn.findPlug("rotateOrder", False), decomposeFn.findPlug("inputRotateOrder", False))
+    modifier.connect(decomposeFn.findPlug("outputRotate", False), jointFn.findPlug("rotate", False))
+    
+    jointName = jointPath.partialPathName().split("|")[-1]
+    modifier.renameNode(multNode, jointName + "_multMatrix")
+    modifier.renameNode(decomposeNode, jointName + "_decomposeMatrix")
+
+
+''' SHAPE LIBRARY
+Controller shapes as precomputed CV and knot data at radius 1, all facing down the X axis like the
+joints' controllers always have. A controller curve is built straight from this data, scaled to the radius,
+instead of running a curve command that works the shape out again for every controller. '''
+
+# Circle of 8 sections, the same curve as pm.circle(normal=(1, 0, 0)) makes.
+# Periodic cubic, so the first 3 CVs are repeated at the end.
+circleSections = 8
+circleCvRadius = 1.108194
+
+circlePoints = [(0.0, circleCvRadius * math.cos(2.0 * math.pi * (index % circleSections) / circleSections),
+                 circleCvRadius * math.sin(2.0 * math.pi * (index % circleSections) / circleSections))
+                for index in range(circleSections + 3)]
+
+squarePoints = [(0.0, 1.0, 1.0), (0.0, 1.0, -1.0), (0.0, -1.0, -1.0), (0.0, -1.0, 1.0), (0.0, 1.0, 1.0)]
+
+diamondPoints = [(0.0, 1.0, 0.0), (0.0, 0.0, -1.0), (0.0, -1.0, 0.0), (0.0, 0.0, 1.0), (0.0, 1.0, 0.0)]
+
+# Flat arrow pointing up Y
+arrowPoints = [(0.0, 1.0, 0.0), (0.0, 0.2, -0.8), (0.0, 0.2, -0.3), (0.0, -1.0, -0.3), (0.0, -1.0, 0.3),
+               (0.0, 0.2, 0.3), (0.0, 0.2, 0.8), (0.0, 1.0, 0.0)]
+
+# Every edge of a cube in one line, some edges are run twice
+cubePoints = [(1.0, 1.0, 1.0), (1.0, 1.0, -1.0), (-1.0, 1.0, -1.0), (-1.0, 1.0, 1.0), (1.0, 1.0, 1.0),
+              (1.0, -1.0, 1.0), (1.0, -1.0, -1.0), (1.0, 1.0, -1.0), (1.0, -1.0, -1.0), (-1.0, -1.0, -1.0),
+              (-1.0, 1.0, -1.0), (-1.0, -1.0, -1.0), (-1.0, -1.0, 1.0), (-1.0, 1.0, 1.0), (-1.0, -1.0, 1.0),
+              (1.0, -1.0, 1.0)]
+
+''' Shape entry of a linear curve through the points '''
+def LinearShape(points):
+    return {"degree": 1, "periodic": False, "points": points, "knots": [float(index) for index in range(len(points))]}
+
+controllerShapes = {
+    "circle": {"degree": 3, "periodic": True, "points": circlePoints,
+               "knots": [float(index) for index in range(-2, circleSections + 3)]},
+    "square": LinearShape(squarePoints),
+    "diamond": LinearShape(diamondPoints),
+    "arrow": LinearShape(arrowPoints),
+    "cube": LinearShape(cubePoints),
+}
+
+# Curve data already built, by shape and radius
+shapeDataCache = {}
+
+''' Curve data of a controller shape at a radius, built once and then shared by every controller shape '''
+def ShapeCurveData(shape, radius):
+    key = (shape, radius)
+    if key not in shapeDataCache:
+        entry = controllerShapes[shape]
+        cvs = om.MPointArray([om.MPoint(x * radius, y * radius, z * radius) for x, y, z in entry["points"]])
+        form = om.MFnNurbsCurve.kPeriodic if entry["periodic"] else om.MFnNurbsCurve.kOpen
+        
+        data = om.MFnNurbsCurveData().create()
+        om.MFnNurbsCurve().create(cvs, entry["knots"], entry["degree"], form, False, False, data)
+        shapeDataCache[key] = data
+    return shapeDataCache[key]
+
+''' Controller transform with a curve of the shape, built from the library data.
+Given an existing curve shape, that shape is instanced under the new controller instead. '''
+def CreateControllerCurve(shape, radius, sharedShape=None):
+    if sharedShape is not None:
+        ctrl = pm.group(empty=True)
+        pm.parent(sharedShape, ctrl, add=True, shape=True)
+        return ctrl
+    
+    entry = controllerShapes[shape]
+    points = [(x * radius, y * radius, z * radius) for x, y, z in entry["points"]]
+    return pm.curve(degree=entry["degree"], periodic=entry["periodic"], point=points, knot=entry["knots"])
+
+
+''' BULK CONTROLLERS
+Builds the controllers for a whole skeleton at once. The joints and their world matrices are read in
+one pass over the DAG, then every offset group, controller and curve shape is created, named, placed
+and parented in a single DAG modifier, instead of a string of PyMEL commands per joint. '''
+
+''' DAG path of a node by name '''
+def GetDagPath(name):
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getDagPath(0)
+
+''' Every joint under and including the root in one pass over the DAG, depth or breadth first.
+Either way a joint always comes after its parent, in linear time and without sorting.
+Returns the joint paths and the index of each joint's parent joint, -1 for the root
+(or a joint under something that is not a joint). '''
+def ReadJointHierarchy(rootPath, breadthFirst=False):
+    paths = []
+    parents = []
+    indexByName = {}
+    
+    traversal = om.MItDag.kBreadthFirst if breadthFirst else om.MItDag.kDepthFirst
+    iterator = om.MItDag(traversal, om.MFn.kJoint)
+    iterator.reset(rootPath, traversal, om.MFn.kJoint)
+    while not iterator.isDone():
+        path = iterator.getPath()
+        parentPath = om.MDagPath(path)
+        parentPath.pop()
+        
+        # The parent joint has always been seen before
+        parents.append(indexByName.get(parentPath.fullPathName(), -1))
+        indexByName[path.fullPathName()] = len(paths)
+        paths.append(path)
+        iterator.next()
+    return paths, parents
+
+''' Controller and group names for a joint, with the chosen prefix '''
+def ControllerNames(jointName, prefix):
+    baseName = jointName.replace("joint", "ctrl")
+    finalCtrlName = f"{prefix}{baseName}_CTRL" if prefix != "None" else f"{baseName}_CTRL"
+    return finalCtrlName, finalCtrlName.replace("_CTRL", "_GRP")
+
+''' Set the translate, rotate and scale of a transform from a matrix, through the modifier '''
+def SetTransformPlugs(modifier, node, matrix):
+    transform = om.MTransformationMatrix(matrix)
+    nodeFn = om.MFnDependencyNode(node)
+    
+    translation = transform.translation(om.MSpace.kTransform)
+    rotation = transform.rotation()
+    scale = transform.scale(om.MSpace.kTransform)
+    for axis, index in (("X", 0), ("Y", 1), ("Z", 2)):
+        modifier.newPlugValueDouble(nodeFn.findPlug("translate" + axis, False), translation[index])
+        modifier.newPlugValueMAngle(nodeFn.findPlug("rotate" + axis, False), om.MAngle(rotation[index]))
+        modifier.newPlugValueDouble(nodeFn.findPlug("scale" + axis, False), scale[index])
+
+''' Create controllers for every joint under the root joint at once.
+Every offset group sits under the controller of its parent joint and holds the joint's transform,
+so the controllers themselves start out zeroed. With sharedShape one curve shape is instanced under
+every controller instead of one each. Returns the controller names in joint order. '''
+def CreateControllersBulk(jointName=None, radius=None, prefix=None, constraintMode=None, shape=None, sharedShape=None):
+    # Anything left out is read from the window
+    jointName = jointName if jointName is not None else jointField.text()
+    radius = radius if radius is not None else radiusSlider.value()
+    prefix = prefix if prefix is not None else prefixOption.currentText()
+    constraintMode = ConstraintMode(constraintMode)
+    shape, sharedShape = ShapeOptions(shape, sharedShape)
+    
+    if not cmds.objExists(jointName):
+        pm.warning(f"Joint {jointName} does not exist")
+        return []
+    
+    paths, parents = ReadJointHierarchy(GetDagPath(jointName))
+    
+    # OpenMaya modifiers are only undoable through the plugin. Without it the controllers
+    # are built with commands instead, which are undone in one chunk.
+    if RigControllersUndo is None or not RigControllersUndo.LoadPlugin():
+        pm.warning("The RigControllersUndo plugin can't be loaded, building the controllers with commands instead")
+        RebuildControllers(jointName, radius, prefix, constraintMode, shape, sharedShape)
+        existing = ExistingControllers(jointName)
+        ctrlNames = [ControllerNames(path.partialPathName().split("|")[-1], prefix)[0] for path in paths]
+        return [existing[ctrlName][0] for ctrlName in ctrlNames if ctrlName in existing]
+    
+    # All world matrices in one pass
+    worldMatrices = [path.inclusiveMatrix() for path in paths]
+    curveData = ShapeCurveData(shape, radius)
+    curveShapes = []
+    
+    modifier = om.MDagModifier()
+    controllers = []
+    ctrlNames = []
+    for index, path in enumerate(paths):
+        finalCtrlName, finalGrpName = ControllerNames(path.partialPathName().split("|")[-1], prefix)
+        parentIndex = parents[index]
+        
+        # Offset group under the parent joint's controller, which sits on the parent joint
+        if parentIndex >= 0:
+            offsetGrp = modifier.createNode("transform", controllers[parentIndex])
+            localMatrix = worldMatrices[index] * worldMatrices[parentIndex].inverse()
+        else:
+            offsetGrp = modifier.createNode("transform")
+            localMatrix = worldMatrices[index]
+        SetTransformPlugs(modifier, offsetGrp, localMatrix)
+        
+        ctrl = modifier.createNode("transform", offsetGrp)
+        modifier.renameNode(offsetGrp, finalGrpName)
+        modifier.renameNode(ctrl, finalCtrlName)
+        
+        # Shared shapes are only created on the first controller
+        if not (sharedShape and curveShapes):
+            curveShape = modifier.createNode("nurbsCurve", ctrl)
+            modifier.newPlugValue(om.MFnDependencyNode(curveShape).findPlug("cached", False), curveData)
+            modifier.renameNode(curveShape, finalCtrlName + "Shape")
+            curveShapes.append(curveShape)
+        
+        # Matrix constraints go in the same modifier. The controller sits right on the joint,
+        # so its world matrix is the joint's
+        if constraintMode == "matrix":
+            offset, orientInverse = MatrixConstraintOffsets(path.fullPathName(), worldMatrices[index], worldMatrices[index])
+            AddMatrixConstraint(modifier, ctrl, path, offset, orientInverse)
+        
+        controllers.append(ctrl)
+        ctrlNames.append(finalCtrlName)
+    
+    # Everything in one undo step: the modifier and the constraints
+    cmds.undoInfo(openChunk=True, chunkName="CreateControllersBulk")
+    try:
+        RigControllersUndo.DoItUndoable(modifier)
+        
+        # Names can have changed on a clash, so go by the nodes
+        ctrlNames = [om.MFnDagNode(ctrl).fullPathName() for ctrl in controllers]
+        if constraintMode != "matrix":
+            for ctrlName, path in zip(ctrlNames, paths):
+                cmds.orientConstraint(ctrlName, path.fullPathName(), maintainOffset=True)
+        
+        # Instances of the shared shape, a DAG modifier can only give a node one parent
+        if sharedShape:
+            shapeName = om.MFnDagNode(curveShapes[0]).fullPathName()
+            for ctrlName in ctrlNames[1:]:
+                cmds.parent(shapeName, ctrlName, add=True, shape=True)
+        
+        # Store the setup with the rig, so it can be rebuilt later
+        TagControllers(ControllerSpec(jointName, radius, prefix, constraintMode, shape, sharedShape), ctrlNames, paths, parents)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    
+    print(f"Created {len(paths)} controllers starting from {jointName}")
+    return ctrlNames
+
+
+''' REBUILD
+The setup a rig was built with (root joint, radius, prefix, shape and constraint mode) is saved as a
+JSON spec on the root joint, and every controller carries a JSON entry of what it was built from:
+its joint, the controller it hangs under, its shape, the rest pose of the joint (translate and joint orient)
+and the transform of the controller itself at rest.
+A rebuild walks the skeleton, works out the entry every controller should have and compares it to
+the entries of the controllers in the scene. Only controllers that are missing get created, only ones
+whose joint is gone get deleted and only the parts of an entry that changed get updated, so the time
+a rebuild takes goes with the size of the edit instead of the size of the skeleton.
+Only rest data is compared, so posing or animating the rig doesn't count as a change. Controllers that do
+have to be placed or constrained again must be at rest, otherwise the rebuild stops and changes nothing,
+since their pose would end up in the setup.
+Controllers with the right name but no entry (built before there were entries) are taken over and
+updated in full. '''
+
+rigSpecAttr = "rigControllerSpec"
+controllerEntryAttr = "rigControllerEntry"
+
+''' The setup of a rig, as stored on its root joint '''
+def ControllerSpec(jointName, radius, prefix, constraintMode, shape, sharedShape):
+    return {"joint": jointName, "radius": radius, "prefix": prefix, "constraintMode": constraintMode,
+            "shape": shape, "sharedShape": sharedShape}
+
+''' Spec stored on a root joint, None if the rig was never built '''
+def LoadControllerSpec(jointName):
+    if not cmds.attributeQuery(rigSpecAttr, node=jointName, exists=True):
+        return None
+    return json.loads(cmds.getAttr(f"{jointName}.{rigSpecAttr}") or "null")
+
+''' Store a JSON string in a string attribute, adding the attribute when it is not there yet '''
+def SetJsonAttr(nodeName, attrName, value):
+    if not cmds.attributeQuery(attrName, node=nodeName, exists=True):
+        cmds.addAttr(nodeName, longName=attrName, dataType="string")
+    cmds.setAttr(f"{nodeName}.{attrName}", json.dumps(value, sort_keys=True), type="string")
+
+''' Rest pose of a joint, its translate and joint orient in degrees. These don't change when the rig is posed. '''
+def JointRest(path):
+    jointFn = om.MFnDependencyNode(path.node())
+    translate = [jointFn.findPlug("translate" + axis, False).asDouble() for axis in "XYZ"]
+    jointOrient = [jointFn.findPlug("jointOrient" + axis, False).asMAngle().asDegrees() for axis in "XYZ"]
+    return {"translate": [round(value, 6) for value in translate], "jointOrient": [round(value, 6) for value in jointOrient]}
+
+''' World matrices of the joints in their rest pose (joint orient and translate, no rotation),
+built down the hierarchy from the rest data '''
+def JointRestMatrices(paths, parents, rests):
+    matrices = []
+    for path, parentIndex, rest in zip(paths, parents, rests):
+        local = om.MTransformationMatrix()
+        local.setRotation(om.MEulerRotation([math.radians(angle) for angle in rest["jointOrient"]]))
+        local.setTranslation(om.MVector(rest["translate"]), om.MSpace.kTransform)
+        parentMatrix = matrices[parentIndex] if parentIndex >= 0 else path.exclusiveMatrix()
+        matrices.append(local.asMatrix() * parentMatrix)
+    return matrices
+
+''' Local matrix of a controller, rounded to store in its entry '''
+def ControllerMatrix(ctrlName):
+    matrix = om.MFnTransform(GetDagPath(ctrlName)).transformation().asMatrix()
+    return [round(value, 6) for value in matrix]
+
+''' Entry of a controller: everything it is built from. The rest transform of the controller is stored
+next to it when it is tagged. '''
+def ControllerEntry(spec, jointPath, parentCtrlName, rest):
+    return {"root": spec["joint"], "joint": jointPath, "parent": parentCtrlName, "radius": spec["radius"],
+            "shape": spec["shape"], "sharedShape": spec["sharedShape"], "constraintMode": spec["constraintMode"],
+            "rest": rest}
+
+''' Whether a stored entry differs from the entry a controller should have, leaving out its rest transform '''
+def EntryChanged(storedEntry, entry):
+    return {key: value for key, value in storedEntry.items() if key != "ctrlRest"} != entry
+
+''' Save the spec on the root joint and an entry on every controller, right after a build '''
+def TagControllers(spec, ctrlNames, paths, parents):
+    SetJsonAttr(spec["joint"], rigSpecAttr, spec)
+    
+    cmds.addAttr(ctrlNames, longName=controllerEntryAttr, dataType="string")
+    for index, (ctrlName, path) in enumerate(zip(ctrlNames, paths)):
+        parentName = ctrlNames[parents[index]].split("|")[-1] if parents[index] >= 0 else ""
+        entry = dict(ControllerEntry(spec, path.fullPathName(), parentName, JointRest(path)), ctrlRest=ControllerMatrix(ctrlName))
+        cmds.setAttr(f"{ctrlName}.{controllerEntryAttr}", json.dumps(entry, sort_keys=True), type="string")
+
+''' Controllers of a rig in the scene by short name, with their full path and entry '''
+def ExistingControllers(rootName):
+    existing = {}
+    for ctrlName in cmds.ls("*." + controllerEntryAttr, objectsOnly=True, long=True) or []:
+        entry = json.loads(cmds.getAttr(f"{ctrlName}.{controllerEntryAttr}") or "{}")
+        if entry.get("root") == rootName:
+            existing[ctrlName.split("|")[-1]] = (ctrlName, entry)
+    return existing
+
+''' Delete the constraint nodes a controller drives its joint with, whatever the mode '''
+def RemoveControllerConstraints(ctrlName):
+    nodes = set(cmds.listConnections(ctrlName, source=False, destination=True, type="orientConstraint") or [])
+    for multNode in cmds.listConnections(ctrlName, source=False, destination=True, type="multMatrix") or []:
+        nodes.add(multNode)
+        nodes.update(cmds.listConnections(multNode, source=False, destination=True, type="decomposeMatrix") or [])
+    if nodes:
+        cmds.delete(list(nodes))
+
+''' Swap the curve of a controller for a new one, or an instance of a shared curve. Returns the new curve shape. '''
+def ReplaceControllerShape(ctrlName, shape, radius, sharedCurve=None):
+    # Removing the path only takes away this instance when the shape is shared
+    for shapePath in cmds.listRelatives(ctrlName, shapes=True, fullPath=True) or []:
+        cmds.parent(shapePath, removeObject=True, shape=True)
+    
+    if sharedCurve:
+        cmds.parent(sharedCurve, ctrlName, add=True, shape=True)
+    else:
+        curve = CreateControllerCurve(shape, radius)
+        cmds.parent(curve.getShape().longName(), ctrlName, relative=True, shape=True)
+        pm.delete(curve)
+    return cmds.listRelatives(ctrlName, shapes=True, fullPath=True)[0]
+
+''' Rebuild the controllers of a rig after the skeleton or the setup changed.
+Starts from the spec stored on the root joint (or the window when there is none) with anything passed in
+on top, saves the result as the new spec and brings the controllers in line with it.
+Returns the names of the controllers that were created, updated and deleted. '''
+def RebuildControllers(jointName=None, radius=None, prefix=None, constraintMode=None, shape=None, sharedShape=None):
+    jointName = jointName if jointName is not None else jointField.text()
+    if not cmds.objExists(jointName):
+        pm.warning(f"Joint {jointName} does not exist")
+        return [], [], []
+    
+    spec = LoadControllerSpec(jointName)
+    if spec is None:
+        spec = ControllerSpec(jointName, radiusSlider.value() if radiusSlider else 5,
+                              prefixOption.currentText() if prefixOption else "None", ConstraintMode(), *ShapeOptions())
+    changes = {"radius": radius, "prefix": prefix, "constraintMode": constraintMode, "shape": shape, "sharedShape": sharedShape}
+    spec.update({key: value for key, value in changes.items() if value is not None})
+    spec["joint"] = jointName
+    
+    # What every controller should be, in joint order so parents come first
+    paths, parents = ReadJointHierarchy(GetDagPath(jointName))
+    rests = [JointRest(path) for path in paths]
+    names = [ControllerNames(path.partialPathName().split("|")[-1], spec["prefix"]) for path in paths]
+    wanted = []
+    for index, path in enumerate(paths):
+        parentName = names[parents[index]][0] if parents[index] >= 0 else ""
+        wanted.append(ControllerEntry(spec, path.fullPathName(), parentName, rests[index]))
+    
+    existing = ExistingControllers(jointName)
+    for ctrlName, _ in names:
+        if ctrlName not in existing and cmds.objExists(ctrlName):
+            existing[ctrlName] = (cmds.ls(ctrlName, long=True)[0], {})
+    
+    # Controllers that get placed or constrained again have to be at rest, or their pose ends up in the setup
+    posed = []
+    for (ctrlName, _), entry in zip(names, wanted):
+        storedEntry = existing[ctrlName][1] if ctrlName in existing else None
+        if not storedEntry or "ctrlRest" not in storedEntry or not EntryChanged(storedEntry, entry):
+            continue
+        if any(storedEntry.get(key) != entry[key] for key in ("parent", "rest", "constraintMode", "joint")):
+            current = om.MMatrix(ControllerMatrix(existing[ctrlName][0]))
+            if not current.isEquivalent(om.MMatrix(storedEntry["ctrlRest"]), 1e-4):
+                posed.append(ctrlName)
+    if posed:
+        pm.warning(f"Controllers are not at rest, put them back before rebuilding: {', '.join(posed)}")
+        return [], [], []
+    
+    restMatrices = JointRestMatrices(paths, parents, rests)
+    
+    shapeKeys = ("shape", "radius", "sharedShape")
+    
+    # A shared curve of the right shape to instance, from a controller that keeps its shape.
+    # Kept by UUID, since its path changes when the controller is moved to another parent.
+    sharedCurve = None
+    if spec["sharedShape"]:
+        for (ctrlName, _), entry in zip(names, wanted):
+            if ctrlName in existing and all(existing[ctrlName][1].get(key) == entry[key] for key in shapeKeys):
+                sharedCurve = cmds.ls(cmds.listRelatives(existing[ctrlName][0], shapes=True, fullPath=True)[0], uuid=True)[0]
+                break
+    
+    created, updated = [], []
+    cmds.undoInfo(openChunk=True, chunkName="RebuildControllers")
+    try:
+        for index, ((ctrlName, grpName), entry) in enumerate(zip(names, wanted)):
+            oldEntry = existing[ctrlName][1] if ctrlName in existing else None
+            if oldEntry is not None and not EntryChanged(oldEntry, entry):
+                continue
+            
+            if oldEntry is None:
+                ctrl = CreateControllerCurve(spec["shape"], spec["radius"], cmds.ls(sharedCurve)[0] if sharedCurve else None)
+                ctrl.rename(ctrlName)
+                grp = pm.group(empty=True, name=grpName)
+                pm.parent(ctrl, grp, relative=True)
+                ctrlPath, grpPath = ctrl.longName(), grp.longName()
+                if spec["sharedShape"] and sharedCurve is None:
+                    sharedCurve = cmds.ls(ctrl.getShape().longName(), uuid=True)[0]
+                created.append(ctrlName)
+            else:
+                ctrlPath = existing[ctrlName][0]
+                grpPath = cmds.listRelatives(ctrlPath, parent=True, fullPath=True)
+                if not grpPath:
+                    grpPath = cmds.group(ctrlPath, name=grpName, absolute=True)
+                    ctrlPath = cmds.listRelatives(grpPath, children=True, type="transform", fullPath=True)[0]
+                else:
+                    grpPath = grpPath[0]
+                if any(oldEntry.get(key) != entry[key] for key in shapeKeys):
+                    curve = ReplaceControllerShape(ctrlPath, spec["shape"], spec["radius"], cmds.ls(sharedCurve)[0] if sharedCurve else None)
+                    if spec["sharedShape"] and sharedCurve is None:
+                        sharedCurve = cmds.ls(curve, uuid=True)[0]
+                updated.append(ctrlName)
+            
+            # Hang the group under the controller of the parent joint
+            if oldEntry is None or oldEntry.get("parent") != entry["parent"]:
+                currentParent = cmds.listRelatives(grpPath, parent=True)
+                if entry["parent"] and (not currentParent or currentParent[0] != entry["parent"]):
+                    grpPath = cmds.parent(grpPath, entry["parent"], relative=True)[0]
+                elif not entry["parent"] and currentParent:
+                    grpPath = cmds.parent(grpPath, world=True, relative=True)[0]
+                grpPath = cmds.ls(grpPath, long=True)[0]
+                ctrlPath = grpPath + "|" + ctrlName
+            
+            # Place the group on the joint's rest pose with the controller zeroed, the same as a bulk build
+            ctrlRest = oldEntry.get("ctrlRest") if oldEntry else None
+            if oldEntry is None or oldEntry.get("rest") != entry["rest"] or oldEntry.get("parent") != entry["parent"]:
+                localMatrix = restMatrices[index]
+                if parents[index] >= 0:
+                    localMatrix = localMatrix * restMatrices[parents[index]].inverse()
+                cmds.xform(grpPath, matrix=list(localMatrix))
+                cmds.xform(ctrlPath, matrix=list(om.MMatrix()))
+                ctrlRest = ControllerMatrix(ctrlPath)
+            
+            # Constraints hold the offset from when they were made, so a moved joint is constrained again too
+            if oldEntry is None or any(oldEntry.get(key) != entry[key] for key in ("constraintMode", "rest", "joint")):
+                RemoveControllerConstraints(ctrlPath)
+                ConstrainJoint(ctrlPath, entry["joint"], spec["constraintMode"])
+            
+            SetJsonAttr(ctrlPath, controllerEntryAttr, dict(entry, ctrlRest=ctrlRest or ControllerMatrix(ctrlPath)))
+        
+        # Controllers whose joint is gone, their children are already moved away
+        wantedNames = set(ctrlName for ctrlName, _ in names)
+        deleted = [ctrlName for ctrlName in existing if ctrlName not in wantedNames]
+        for ctrlName in deleted:
+            ctrlPath = existing[ctrlName][0]
+            if not cmds.objExists(ctrlPath):
+                continue
+            RemoveControllerConstraints(ctrlPath)
+            grpPath = cmds.listRelatives(ctrlPath, parent=True, fullPath=True)
+            cmds.delete(grpPath if grpPath and grpPath[0].split("|")[-1].endswith("_GRP") else ctrlPath)
+        
+        SetJsonAttr(jointName, rigSpecAttr, spec)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    
+    print(f"Rebuilt controllers from {jointName}: {len(created)} created, {len(updated)} updated, {len(deleted)} deleted")
+    return created, updated, deleted
+
+
+''' BENCHMARK
+Run from the script editor (or mayapy) with this file imported:
+    RigControllers.BenchmarkControllers(800)
+    RigControllers.BenchmarkPlayback(400)
+Builds a test skeleton and times the chain, the bulk and the bulk mode with one shared shape on it, or the playback
+of orient constraints against matrix constraints. '''
+
+''' Test skeleton of a spine with limbs branching off it, jointCount joints in total '''
+def CreateTestSkeleton(jointCount, limbLength=10):
+    cmds.select(clear=True)
+    root = cmds.joint(name="bench_joint0", position=(0, 0, 0))
+    spine = root
+    created = 1
+    
+    while created < jointCount:
+        # One more spine joint, then a limb hanging off it
+        cmds.select(spine)
+        spine = cmds.joint(name=f"bench_joint{created}", position=(0, created * 0.1, 0))
+        created += 1
+        
+        cmds.select(spine)
+        for limbIndex in range(min(limbLength, jointCount - created)):
+            cmds.joint(name=f"bench_joint{created}", position=(limbIndex + 1, created * 0.1, 0))
+            created += 1
+    
+    cmds.select(clear=True)
+    return root
+
+def BenchmarkControllers(jointCount=800):
+    global jointField, radiusSlider, prefixOption
+    
+    windowFields = (jointField, radiusSlider, prefixOption)
+    results = []
+    for mode in ("chain", "bulk", "shared"):
+        cmds.file(new=True, force=True)
+        root = CreateTestSkeleton(jointCount)
+        
+        start = time.perf_counter()
+        if mode == "chain":
+            # The chain mode reads the window, give it stand-in fields
+            jointField, radiusSlider, prefixOption = BenchmarkField(root), BenchmarkField(5), BenchmarkField("None")
+            CreateControllerChain(shape="circle", sharedShape=False)
+        else:
+            CreateControllersBulk(root, 5, "None", shape="circle", sharedShape=mode == "shared")
+        seconds = time.perf_counter() - start
+        
+        nodeCount = len(cmds.ls(type="nurbsCurve"))
+        results.append((mode, seconds, nodeCount))
+        print(f"{mode:>6}: {jointCount} joints in {seconds:.2f}s, {jointCount / seconds:.0f} joints/s, {nodeCount} curve shapes")
+    
+    cmds.file(new=True, force=True)
+    jointField, radiusSlider, prefixOption = windowFields
+    return results
+
+''' Compare playback speed of orient constraints and matrix constraints on a test skeleton.
+Every controller gets a rotation animated over the frames, then the frames are stepped through
+under parallel evaluation and the joints are read back so everything is evaluated. '''
+def BenchmarkPlayback(jointCount=400, frameCount=100):
+    results = []
+    for constraintMode in ("orient", "matrix"):
+        cmds.file(new=True, force=True)
+        root = CreateTestSkeleton(jointCount)
+        ctrlNames = CreateControllersBulk(root, 5, "None", constraintMode)
+        
+        cmds.setKeyframe(ctrlNames, attribute="rotateZ", time=1, value=0)
+        cmds.setKeyframe(ctrlNames, attribute="rotateZ", time=frameCount, value=45)
+        cmds.evaluationManager(mode="parallel")
+        
+        # Joints at the end of every limb, reading them pulls the whole chain above them
+        endJoints = [joint for joint in cmds.ls(type="joint", long=True) if not cmds.listRelatives(joint, children=True, type="joint")]
+        
+        start = time.perf_counter()
+        for frame in range(1, frameCount + 1):
+            cmds.currentTime(frame, update=True)
+            for joint in endJoints:
+                cmds.getAttr(joint + ".worldMatrix[0]")
+        seconds = time.perf_counter() - start
+        
+        results.append((constraintMode, frameCount / seconds))
+        print(f"{constraintMode:>6}: {jointCount} joints, {frameCount / seconds:.1f} fps")
+    
+    cmds.file(new=True, force=True)
+    return results
+
+''' Stands in for a window field in the benchmark '''
+class BenchmarkField(object):
+    def __init__(self, value):
+        self.value = lambda: value
+        self.text = lambda: value
+        self.currentText = lambda: value
     
     
 def CreateWindow():
@@ -91,6 +756,9 @@ def CreateWindow():
     global jointField
     global radiusSlider
     global prefixOption
+    global constraintOption
+    global shapeOption
+    global sharedShapeCheckBox
     
     # Delete eventual existing window
     if ctrlWindow:
@@ -100,7 +768,7 @@ def CreateWindow():
     # Create window
     ctrlWindow = QtWidgets.QWidget()
     ctrlWindow.setWindowTitle("Rig Controller Creator")
-    ctrlWindow.setFixedSize(480, 280) # SIZE HERE
+    ctrlWindow.setFixedSize(480, 500) # SIZE HERE
     
     layout = QtWidgets.QVBoxLayout(ctrlWindow)
     
@@ -137,17 +805,44 @@ def CreateWindow():
     prefixOption.addItems(["None", "L_", "R_"])
     layout.addWidget(prefixOption)
     
+    # Constraint options
+    layout.addWidget(QtWidgets.QLabel("Constraint"))
+    constraintOption = QtWidgets.QComboBox()
+    constraintOption.addItems(list(constraintModes))
+    layout.addWidget(constraintOption)
+    
+    # Shape options
+    layout.addWidget(QtWidgets.QLabel("Shape"))
+    shapeOption = QtWidgets.QComboBox()
+    shapeOption.addItems(list(controllerShapes))
+    layout.addWidget(shapeOption)
+    
+    sharedShapeCheckBox = QtWidgets.QCheckBox("Share one shape between controllers (instanced)")
+    layout.addWidget(sharedShapeCheckBox)
+    
     # Create button
     createBtn = QtWidgets.QPushButton("Create Controller")
-    createBtn.clicked.connect(CreateController)
+    createBtn.clicked.connect(lambda: CreateController())
     layout.addWidget(createBtn)
     
     # Create chain button
     createChainBtn = QtWidgets.QPushButton("Create controllers on chain")
-    createChainBtn.clicked.connect(CreateControllerChain)
+    createChainBtn.clicked.connect(lambda: CreateControllerChain())
     layout.addWidget(createChainBtn)
     
+    # Bulk button, the whole skeleton in one go
+    createBulkBtn = QtWidgets.QPushButton("Create controllers on skeleton (bulk)")
+    createBulkBtn.clicked.connect(lambda: CreateControllersBulk())
+    layout.addWidget(createBulkBtn)
+    
+    # Rebuild button, brings an existing rig in line with the skeleton and the options above
+    rebuildBtn = QtWidgets.QPushButton("Rebuild controllers")
+    rebuildBtn.clicked.connect(lambda: RebuildControllers(jointField.text(), radiusSlider.value(), prefixOption.currentText(),
+                                                          ConstraintMode(), *ShapeOptions()))
+    layout.addWidget(rebuildBtn)
+    
     ctrlWindow.show()
     
 # Open window
-CreateWindow()
\ No newline at end of file
+if __name__ == "__main__":
+    CreateWindow()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+
+# Undoable command for OpenMaya modifiers, loaded as a plugin by RigControllers.
+# Modifiers don't end up in the undo queue by themselves, so this plugin has one command that runs
+# a waiting modifier and keeps it around to undo and redo it. Kept apart from the window, so loading it
+# as a plugin doesn't import the UI a second time.
+
+def maya_useNewAPI():
+    pass
+
+# Modifiers waiting to be run by the command. Kept when Maya imports this file again to load it.
+if "pendingModifiers" not in globals():
+    pendingModifiers = []
+
+class ModifierCommand(om.MPxCommand):
+    commandName = "rigControllersDoIt"
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.modifier = None
+
+    def doIt(self, args):
+        self.modifier = pendingModifiers.pop()
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def isUndoable(self):
+        return True
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin).registerCommand(ModifierCommand.commandName, lambda: ModifierCommand())
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(ModifierCommand.commandName)
+
+''' Load this file as a plugin if it isn't yet. False when the command is not there after all. '''
+def LoadPlugin():
+    try:
+        if not cmds.pluginInfo(__file__, query=True, loaded=True):
+            cmds.loadPlugin(__file__, quiet=True)
+    except RuntimeError:
+        return False
+    return hasattr(cmds, ModifierCommand.commandName)
+
+''' Run a modifier through the undoable command, the plugin has to be loaded '''
+def DoItUndoable(modifier):
+    pendingModifiers.append(modifier)
+    getattr(cmds, ModifierCommand.commandName)()
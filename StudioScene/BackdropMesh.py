@@ -0,0 +1,72 @@
+import numpy as np
+
+# Curved studio backdrop (cyclorama) worked out directly as mesh arrays, no modelling steps.
+# The profile runs along -Z over the floor, bends up through a quarter circle cove and goes up the
+# wall at the back, and is swept across the width along X. It is a closed solid: the front sheet,
+# the back sheet pushed in by the thickness and the rim between them.
+# Nothing here needs Maya, SceneBuilder makes the mesh of the arrays with one MFnMesh.create call.
+#
+#                       wall
+#                        |
+#     cove radius ->     \__________  floor
+#                         <- floorDepth ->
+
+
+''' Points (P, 2) of the profile as (z, y) and the direction (P, 2) the visible side faces,
+from the front of the floor to the top of the wall. The floor is at y = 0, centered on z = 0. '''
+def BackdropProfile(floorDepth, wallHeight, coveRadius, segments):
+    back = -0.5 * floorDepth
+    angles = np.linspace(0.0, 0.5 * np.pi, segments + 1)
+
+    # Cove around its center, starting straight below it on the floor and ending straight behind it on the wall
+    center = np.array([back + coveRadius, coveRadius])
+    cove = center + coveRadius * np.stack([-np.sin(angles), -np.cos(angles)], axis=1)
+
+    points = np.concatenate([[[0.5 * floorDepth, 0.0]], cove, [[back, wallHeight]]])
+    normals = np.concatenate([[[0.0, 1.0]], np.stack([np.sin(angles), np.cos(angles)], axis=1), [[1.0, 0.0]]])
+
+    # Skip ends that fall on the cove, when it takes up the whole floor or wall
+    keep = np.concatenate([[True], np.linalg.norm(np.diff(points, axis=0), axis=1) > 1e-9])
+    return points[keep], normals[keep]
+
+''' Vertices, faces and uvs of the backdrop. Returns points (V, 3), faceCounts (F,), faceConnects
+and uvs (V, 2), uvs running across the width and along the profile and shared by every face. '''
+def BackdropArrays(width=20.0, floorDepth=20.0, wallHeight=15.0, coveRadius=3.0, segments=12, thickness=0.2,
+                   widthSegments=1):
+    profile, normals = BackdropProfile(floorDepth, wallHeight, coveRadius, segments)
+    profileCount = len(profile)
+    columnCount = widthSegments + 1
+    xs = np.linspace(-0.5 * width, 0.5 * width, columnCount)
+
+    # Front sheet and back sheet, profile index first, one row of columns per profile point
+    sheets = []
+    for offset in (0.0, -thickness):
+        zy = profile + offset * normals
+        sheets.append(np.stack([np.repeat(xs[None], profileCount, axis=0),
+                                np.repeat(zy[:, 1:2], columnCount, axis=1),
+                                np.repeat(zy[:, 0:1], columnCount, axis=1)], axis=2).reshape(-1, 3))
+    points = np.concatenate(sheets)
+
+    front = np.arange(profileCount * columnCount).reshape(profileCount, columnCount)
+    back = front + profileCount * columnCount
+
+    # Quads of both sheets, counter clockwise seen from the side they face
+    quads = [np.stack([front[:-1, :-1], front[:-1, 1:], front[1:, 1:], front[1:, :-1]], axis=-1).reshape(-1, 4),
+             np.stack([back[:-1, :-1], back[1:, :-1], back[1:, 1:], back[:-1, 1:]], axis=-1).reshape(-1, 4)]
+
+    # Rim: both sides along the profile, the front edge of the floor and the top edge of the wall
+    quads.append(np.stack([front[:-1, 0], front[1:, 0], back[1:, 0], back[:-1, 0]], axis=-1))
+    quads.append(np.stack([front[:-1, -1], back[:-1, -1], back[1:, -1], front[1:, -1]], axis=-1))
+    quads.append(np.stack([back[0, :-1], back[0, 1:], front[0, 1:], front[0, :-1]], axis=-1))
+    quads.append(np.stack([front[-1, :-1], front[-1, 1:], back[-1, 1:], back[-1, :-1]], axis=-1))
+
+    faceConnects = np.concatenate(quads).reshape(-1)
+    faceCounts = np.full(len(faceConnects) // 4, 4, dtype=np.int64)
+
+    # v along the length of the profile, so the texture doesn't stretch around the cove
+    lengths = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(profile, axis=0), axis=1))])
+    u = np.tile(np.linspace(0.0, 1.0, columnCount), profileCount)
+    v = np.repeat(lengths / lengths[-1], columnCount)
+    uvs = np.tile(np.stack([u, v], axis=1), (2, 1))
+
+    return points, faceCounts, faceConnects.astype(np.int64), uvs
@@ -0,0 +1,355 @@
+import json
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+
+import SceneSpec
+from BackdropMesh import BackdropArrays
+
+# Builds a scene from a scene spec (see SceneSpec.py) in one pass.
+# Every shader, shading group and poly creator node is created in one DG modifier and every light,
+# transform and mesh in one DAG modifier, with all of their attributes and connections set through
+# the modifiers as well. What is left for commands is done in bulk, one call for all nodes:
+# adding the lights to the light set, the default shading, deleting faces and one sets call per material.
+# Backdrops are worked out as arrays (see BackdropMesh.py) and made with one MFnMesh.create call each,
+# without any construction history.
+# Every node made for a spec is tagged with the spec entry it came from, so UpdateScene can find the
+# nodes of a scene again and only change what differs from the spec.
+
+# Goes up whenever a change here changes what a spec builds, so prebuilt scenes are built again
+builderVersion = 2
+
+# Poly creator node of every geometry type
+creatorTypes = {"plane": "polyPlane", "cube": "polyCube"}
+
+intTypes = (om.MFnNumericData.kInt, om.MFnNumericData.kShort, om.MFnNumericData.kLong, om.MFnNumericData.kByte,
+            om.MFnNumericData.kChar)
+
+
+''' Plug of a node by name, as "node.attribute" '''
+def GetPlug(plugName):
+    selection = om.MSelectionList()
+    selection.add(plugName)
+    return selection.getPlug(0)
+
+def FindPlug(node, attrName):
+    return om.MFnDependencyNode(node).findPlug(attrName, False)
+
+''' Set a plug to a spec value through the modifier. Lists go on the children of a compound, like a color. '''
+def SetPlugValue(modifier, plug, value):
+    if isinstance(value, list):
+        for index, item in enumerate(value):
+            SetPlugValue(modifier, plug.child(index), item)
+        return
+
+    attribute = plug.attribute()
+    if isinstance(value, str):
+        modifier.newPlugValueString(plug, value)
+    elif isinstance(value, bool):
+        modifier.newPlugValueBool(plug, value)
+    elif attribute.hasFn(om.MFn.kEnumAttribute) or (attribute.hasFn(om.MFn.kNumericAttribute) and
+                                                      om.MFnNumericAttribute(attribute).numericType() in intTypes):
+        modifier.newPlugValueInt(plug, int(value))
+    else:
+        modifier.newPlugValueDouble(plug, float(value))
+
+''' Set every attribute of a node from a dict through the modifier '''
+def SetAttributes(modifier, node, attributes):
+    for attrName, value in attributes.items():
+        SetPlugValue(modifier, FindPlug(node, attrName), value)
+
+''' Set the translate, rotate (in degrees) and scale of a transform from a spec entry '''
+def SetTransform(modifier, node, entry):
+    for axis, index in (("X", 0), ("Y", 1), ("Z", 2)):
+        if "translate" in entry:
+            modifier.newPlugValueDouble(FindPlug(node, "translate" + axis), entry["translate"][index])
+        if "rotate" in entry:
+            modifier.newPlugValueMAngle(FindPlug(node, "rotate" + axis), om.MAngle(entry["rotate"][index], om.MAngle.kDegrees))
+        if "scale" in entry:
+            modifier.newPlugValueDouble(FindPlug(node, "scale" + axis), entry["scale"][index])
+
+''' The next free elements of an array plug, to connect to like connectAttr -nextAvailable '''
+def NextElements(plugName, count):
+    plug = GetPlug(plugName)
+    start = max(plug.getExistingArrayAttributeIndices() or [-1]) + 1
+    return [plug.elementByLogicalIndex(start + index) for index in range(count)]
+
+''' Shading group of a material that is already in the scene '''
+def FindShadingGroup(materialName):
+    shadingGroups = cmds.listConnections(materialName + ".outColor", source=False, destination=True, type="shadingEngine")
+    return shadingGroups[0] if shadingGroups else None
+
+''' Whether BuildScene reuses a material of the scene instead of making it, by name and type '''
+def IsReusedMaterial(material):
+    return cmds.objExists(material["name"]) and cmds.nodeType(material["name"]) == material["type"]
+
+''' Give a transform the backdrop mesh of the params, returns the new mesh shape '''
+def CreateBackdropMesh(transform, params):
+    points, faceCounts, faceConnects, uvs = BackdropArrays(**params)
+
+    meshFn = om.MFnMesh()
+    meshFn.create(om.MPointArray(points.tolist()), faceCounts.tolist(), faceConnects.tolist(),
+                  uvs[:, 0].tolist(), uvs[:, 1].tolist(), parent=transform)
+    meshFn.assignUVs(faceCounts.tolist(), faceConnects.tolist())
+    return meshFn.object()
+
+''' Build every light, material and piece of geometry of a spec. Returns the names of the nodes made
+(or the materials reused) by spec name, which can differ from the spec when the name was taken. '''
+def BuildScene(spec):
+    errors = SceneSpec.ValidateSceneSpec(spec)
+    if errors:
+        raise ValueError("Scene spec is not valid:\n  " + "\n  ".join(errors))
+
+    lights = spec.get("lights", [])
+    materials = spec.get("materials", [])
+    geometry = spec.get("geometry", [])
+
+    # The lights and Arnold materials come from mtoa
+    if (lights or any(material["type"].startswith("ai") for material in materials)) and \
+            not cmds.pluginInfo("mtoa", query=True, loaded=True):
+        cmds.loadPlugin("mtoa")
+
+    dgModifier = om.MDGModifier()
+    dagModifier = om.MDagModifier()
+
+    # MATERIALS, the ones already in the scene are reused
+    shadingGroups = {}
+    newMaterials = []
+    reusedMaterials = []
+    for material in materials:
+        if IsReusedMaterial(material):
+            shadingGroups[material["name"]] = FindShadingGroup(material["name"])
+            reusedMaterials.append(material["name"])
+            continue
+
+        shader = dgModifier.createNode(material["type"])
+        shadingGroup = dgModifier.createNode("shadingEngine")
+        SetAttributes(dgModifier, shader, material.get("attributes", {}))
+        dgModifier.connect(FindPlug(shader, "outColor"), FindPlug(shadingGroup, "surfaceShader"))
+        dgModifier.renameNode(shader, material["name"])
+        dgModifier.renameNode(shadingGroup, material["name"] + "SG")
+        newMaterials.append((material["name"], shader, shadingGroup))
+
+    # Registered like shadingNode -asShader and sets -renderable do
+    shaderElements = NextElements("defaultShaderList1.shaders", len(newMaterials))
+    partitionElements = NextElements("renderPartition.sets", len(newMaterials))
+    for (_, shader, shadingGroup), shaderElement, partitionElement in zip(newMaterials, shaderElements, partitionElements):
+        dgModifier.connect(FindPlug(shader, "message"), shaderElement)
+        dgModifier.connect(FindPlug(shadingGroup, "partition"), partitionElement)
+
+    # LIGHTS
+    lightNodes = []
+    for light in lights:
+        transform = dagModifier.createNode("transform")
+        shape = dagModifier.createNode(light["type"], transform)
+        SetTransform(dagModifier, transform, light)
+        SetAttributes(dagModifier, shape, light.get("attributes", {}))
+        dagModifier.renameNode(transform, light["name"])
+        dagModifier.renameNode(shape, light["name"] + "Shape")
+        lightNodes.append((light["name"], transform))
+
+    # GEOMETRY, a poly creator node into a mesh, the same as polyPlane and polyCube make.
+    # Backdrops only get their transform here, the mesh is made under it afterwards.
+    geometryNodes = []
+    for entry in geometry:
+        transform = dagModifier.createNode("transform")
+        SetTransform(dagModifier, transform, entry)
+        dagModifier.renameNode(transform, entry["name"])
+        geometryNodes.append((entry, transform))
+        if entry["type"] == "backdrop":
+            continue
+
+        creator = dgModifier.createNode(creatorTypes[entry["type"]])
+        SetAttributes(dgModifier, creator, SceneSpec.GeometryParams(entry))
+
+        mesh = dagModifier.createNode("mesh", transform)
+        dagModifier.renameNode(mesh, entry["name"] + "Shape")
+        dagModifier.connect(FindPlug(creator, "output"), FindPlug(mesh, "inMesh"))
+
+    # Creators and shaders first, the meshes connect to them
+    dgModifier.doIt()
+    dagModifier.doIt()
+
+    for entry, transform in geometryNodes:
+        if entry["type"] == "backdrop":
+            mesh = CreateBackdropMesh(transform, SceneSpec.GeometryParams(entry))
+            om.MFnDependencyNode(mesh).setName(om.MFnDependencyNode(transform).name() + "Shape")
+
+    nodeNames = {name: name for name in reusedMaterials}
+    for name, shader, shadingGroup in newMaterials:
+        nodeNames[name] = om.MFnDependencyNode(shader).name()
+        shadingGroups[name] = om.MFnDependencyNode(shadingGroup).name()
+    for name, transform in lightNodes:
+        nodeNames[name] = om.MFnDagNode(transform).fullPathName()
+    for entry, transform in geometryNodes:
+        nodeNames[entry["name"]] = om.MFnDagNode(transform).fullPathName()
+
+    lightNames = [nodeNames[name] for name, _ in lightNodes]
+    if lightNames:
+        cmds.sets(lightNames, add="defaultLightSet")
+
+    meshNames = [nodeNames[entry["name"]] for entry, _ in geometryNodes]
+    if meshNames:
+        cmds.sets(meshNames, edit=True, forceElement="initialShadingGroup")
+
+    deleteFaces = [f"{nodeNames[entry['name']]}.f[{face}]" for entry in geometry for face in entry.get("deleteFaces", [])]
+    if deleteFaces:
+        cmds.delete(deleteFaces)
+
+    # Faces of all geometry per material, one sets call each
+    materialFaces = {}
+    for entry in geometry:
+        for materialName, faces in entry.get("materials", {}).items():
+            materialFaces.setdefault(materialName, []).extend(f"{nodeNames[entry['name']]}.f[{face}]" for face in faces)
+    for materialName, faces in materialFaces.items():
+        cmds.sets(faces, edit=True, forceElement=shadingGroups[materialName])
+
+    TagNodes(spec, nodeNames)
+    return nodeNames
+
+
+''' UPDATE
+Makes an existing scene match a spec with as little work as possible, and does nothing at all
+when it already does. The nodes of the scene are found by their tag, which holds the name of the
+scene and the spec entry the node was built from:
+  - entries without a node are built, nodes without an entry are deleted
+  - a node whose type changed, or geometry whose params, deleted faces or materials changed,
+    is built again, since its node network or topology is different
+  - for everything else the current transform and attributes in the scene are compared to the spec
+    and only the values that differ are set, so changes made by hand are put back as well
+Nodes without a tag are never touched. '''
+
+sceneEntryAttr = "studioSceneEntry"
+
+# Parts of an entry that can only change by building the node again
+structureKeys = {"lights": ("type",), "materials": ("type",), "geometry": ("type", "params", "deleteFaces", "materials")}
+transformDefaults = {"translate": [0.0, 0.0, 0.0], "rotate": [0.0, 0.0, 0.0], "scale": [1.0, 1.0, 1.0]}
+
+''' Tag the nodes of a spec with the scene name and their entry, the attribute is added to all of them in one go '''
+def TagNodes(spec, nodeNames):
+    untagged = [nodeName for nodeName in nodeNames.values() if not cmds.attributeQuery(sceneEntryAttr, node=nodeName, exists=True)]
+    if untagged:
+        cmds.addAttr(untagged, longName=sceneEntryAttr, dataType="string")
+
+    for section in ("lights", "materials", "geometry"):
+        for entry in spec.get(section, []):
+            tag = {"scene": spec.get("name", "scene"), "section": section, "entry": entry}
+            cmds.setAttr(f"{nodeNames[entry['name']]}.{sceneEntryAttr}", json.dumps(tag, sort_keys=True), type="string")
+
+''' Tagged nodes of a scene by section and spec name, with their tag '''
+def TaggedNodes(sceneName):
+    nodes = {}
+    for nodeName in cmds.ls("*." + sceneEntryAttr, objectsOnly=True, long=True) or []:
+        tag = json.loads(cmds.getAttr(f"{nodeName}.{sceneEntryAttr}") or "{}")
+        if tag.get("scene") == sceneName:
+            nodes[(tag["section"], tag["entry"]["name"])] = (nodeName, tag)
+    return nodes
+
+def ValuesDiffer(current, wanted):
+    if isinstance(wanted, list):
+        current = current[0] if current and isinstance(current[0], tuple) else current
+        return len(current) != len(wanted) or any(abs(a - b) > 1e-5 for a, b in zip(current, wanted))
+    if isinstance(wanted, (bool, str)):
+        return current != wanted
+    return abs(current - wanted) > 1e-5
+
+''' Set a value with setAttr, the same kinds of values as a spec has '''
+def SetAttrValue(plugName, value):
+    if isinstance(value, list):
+        cmds.setAttr(plugName, *value)
+    elif isinstance(value, str):
+        cmds.setAttr(plugName, value, type="string")
+    else:
+        cmds.setAttr(plugName, value)
+
+''' Set the transform and attributes of a node that differ from its spec entry, returns how many were set '''
+def ApplyDifferences(nodeName, section, entry):
+    changed = 0
+    if section != "materials":
+        for key, default in transformDefaults.items():
+            wanted = entry.get(key, default)
+            if ValuesDiffer(cmds.getAttr(f"{nodeName}.{key}"), wanted):
+                cmds.setAttr(f"{nodeName}.{key}", *wanted)
+                changed += 1
+
+    # Light attributes are on the shape
+    attrNode = nodeName
+    if section == "lights":
+        attrNode = cmds.listRelatives(nodeName, shapes=True, fullPath=True)[0]
+    for attrName, wanted in entry.get("attributes", {}).items():
+        plugName = f"{attrNode}.{attrName}"
+        if ValuesDiffer(cmds.getAttr(plugName), wanted):
+            SetAttrValue(plugName, wanted)
+            changed += 1
+    return changed
+
+''' Delete a node of the scene, a material together with its shading group '''
+def DeleteSceneNode(nodeName, section):
+    nodes = [nodeName]
+    if section == "materials":
+        shadingGroup = FindShadingGroup(nodeName)
+        if shadingGroup:
+            nodes.append(shadingGroup)
+    cmds.delete(nodes)
+
+''' Bring the scene in line with a spec, building, updating and deleting only what differs.
+Returns the spec names of the nodes that were built, updated and deleted. '''
+def UpdateScene(spec):
+    errors = SceneSpec.ValidateSceneSpec(spec)
+    if errors:
+        raise ValueError("Scene spec is not valid:\n  " + "\n  ".join(errors))
+
+    tagged = TaggedNodes(spec.get("name", "scene"))
+    toBuild = {"lights": [], "materials": [], "geometry": []}
+    updated = []
+    wanted = set()
+    rebuiltMaterials = set()
+
+    for section in ("lights", "materials", "geometry"):
+        for entry in spec.get(section, []):
+            key = (section, entry["name"])
+            wanted.add(key)
+            if key not in tagged or not cmds.objExists(tagged[key][0]):
+                toBuild[section].append(entry)
+                continue
+
+            nodeName, tag = tagged[key]
+            if any(tag["entry"].get(structureKey) != entry.get(structureKey) for structureKey in structureKeys[section]):
+                DeleteSceneNode(nodeName, section)
+                toBuild[section].append(entry)
+                if section == "materials":
+                    rebuiltMaterials.add(entry["name"])
+                continue
+
+            if ApplyDifferences(nodeName, section, entry) or tag["entry"] != entry:
+                tag["entry"] = entry
+                cmds.setAttr(f"{nodeName}.{sceneEntryAttr}", json.dumps(tag, sort_keys=True), type="string")
+                updated.append(entry["name"])
+
+    # Nodes the spec doesn't have any more
+    deleted = []
+    for key, (nodeName, _) in tagged.items():
+        if key not in wanted and cmds.objExists(nodeName):
+            DeleteSceneNode(nodeName, key[0])
+            deleted.append(key[1])
+
+    # Built in one pass like a whole scene. Geometry can use materials that are already there,
+    # so all of them go in, the ones that exist are reused.
+    built = [entry["name"] for entries in toBuild.values() for entry in entries]
+    nodeNames = {}
+    if built:
+        nodeNames = BuildScene({"name": spec.get("name", "scene"), "lights": toBuild["lights"], "geometry": toBuild["geometry"],
+                                "materials": spec.get("materials", [])})
+
+    # Geometry that stayed lost the faces of materials that were built again
+    for entry in spec.get("geometry", []):
+        if entry in toBuild["geometry"]:
+            continue
+        for materialName, faces in entry.get("materials", {}).items():
+            if materialName in rebuiltMaterials:
+                nodeName = tagged[("geometry", entry["name"])][0]
+                cmds.sets([f"{nodeName}.f[{face}]" for face in faces], edit=True,
+                          forceElement=FindShadingGroup(nodeNames[materialName]))
+
+    print(f"Updated scene {spec.get('name', 'scene')}: {len(built)} built, {len(updated)} updated, {len(deleted)} deleted")
+    return built, updated, deleted
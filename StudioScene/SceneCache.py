@@ -0,0 +1,95 @@
+import os
+
+import maya.cmds as cmds
+
+import SceneBuilder
+import SceneSpec
+
+# Prebuilt scenes for the StudioScene templates.
+# The first time a spec is asked for it is built as usual, its history is deleted and the nodes are
+# saved to a Maya file named after a hash of the spec and SceneBuilder.builderVersion.
+# Every later call for the same spec reads that file instead of running the modelling steps again:
+#   import    - import the nodes into the current scene (the default)
+#   reference - reference the file under the spec's name as namespace
+#   open      - open the file as the scene, for batch jobs that start from a template
+
+fileTypes = {"mayaBinary": ".mb", "mayaAscii": ".ma"}
+
+
+''' The scene cache lives in the Maya user folder '''
+def DefaultCacheDir():
+    return os.path.join(cmds.internalVar(userAppDir=True), "sceneCache")
+
+''' File a spec is prebuilt to '''
+def CachedScenePath(spec, cacheDir=None, fileType="mayaBinary"):
+    name = spec.get("name", "scene")
+    key = SceneSpec.SpecHash(spec, SceneBuilder.builderVersion)
+    return os.path.join(cacheDir or DefaultCacheDir(), f"{name}_{key}{fileTypes[fileType]}")
+
+''' Build a spec in the current scene and save what was built to a file, without history '''
+def PrebuildScene(spec, path, fileType="mayaBinary"):
+    nodeNames = SceneBuilder.BuildScene(spec)
+
+    meshNames = [nodeNames[entry["name"]] for entry in spec.get("geometry", [])]
+    if meshNames:
+        cmds.delete(meshNames, constructionHistory=True)
+
+    # Written next to it first, so a half written file is never picked up
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tempPath = path + ".tmp" + fileTypes[fileType]
+    cmds.select(list(nodeNames.values()), replace=True, noExpand=True)
+    cmds.file(tempPath, exportSelected=True, type=fileType, force=True, preserveReferences=False)
+    cmds.select(clear=True)
+    os.replace(tempPath, path)
+    return nodeNames
+
+''' Delete the nodes BuildScene made for a spec, materials with their shading group,
+but not the materials it reused '''
+def DeleteBuiltNodes(spec, nodeNames, reused):
+    nodes = [nodeName for name, nodeName in nodeNames.items() if name not in reused]
+    for material in spec.get("materials", []):
+        if material["name"] not in reused:
+            shadingGroup = SceneBuilder.FindShadingGroup(nodeNames[material["name"]])
+            if shadingGroup:
+                nodes.append(shadingGroup)
+    if nodes:
+        cmds.delete(nodes)
+
+''' Load a spec from the scene cache, building it first when it is not there.
+Returns the path of the cached file. '''
+def LoadScene(spec, cacheDir=None, mode="import", fileType="mayaBinary"):
+    errors = SceneSpec.ValidateSceneSpec(spec)
+    if errors:
+        raise ValueError("Scene spec is not valid:\n  " + "\n  ".join(errors))
+
+    path = CachedScenePath(spec, cacheDir, fileType)
+    if not os.path.exists(path):
+        if mode == "import":
+            # What was just built is the same as what would be imported
+            PrebuildScene(spec, path, fileType)
+            print(f"Built {spec.get('name', 'scene')} and saved it to {path}")
+            return path
+
+        if mode == "open":
+            # Built in a new scene, which the file then replaces
+            cmds.file(new=True, force=True)
+            PrebuildScene(spec, path, fileType)
+        else:
+            # Built in the scene only to save it, the reference takes its place.
+            # Materials that were already in the scene are left alone.
+            reused = set(material["name"] for material in spec.get("materials", []) if SceneBuilder.IsReusedMaterial(material))
+            nodeNames = PrebuildScene(spec, path, fileType)
+            DeleteBuiltNodes(spec, nodeNames, reused)
+        print(f"Built {spec.get('name', 'scene')} and saved it to {path}")
+
+    # Lights of the file need mtoa to load
+    if spec.get("lights") and not cmds.pluginInfo("mtoa", query=True, loaded=True):
+        cmds.loadPlugin("mtoa")
+
+    if mode == "open":
+        cmds.file(path, open=True, force=True)
+    elif mode == "reference":
+        cmds.file(path, reference=True, namespace=spec.get("name", "scene"))
+    else:
+        cmds.file(path, i=True, defaultNamespace=True)
+    return path
@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+# Scene specs for the StudioScene templates.
+# A spec is a JSON file describing the lights, materials and geometry of a lighting scene:
+#   {
+#       "lights": [{"name": "keyLight", "type": "aiAreaLight", "translate": [0, 10, 0], "rotate": [-90, 0, 0],
+#                   "scale": [5, 5, 5], "attributes": {"intensity": 2.0, "color": [1, 1, 1], "normalize": false}}],
+#       "materials": [{"name": "redLambert", "type": "lambert", "attributes": {"color": [1, 0, 0]}}],
+#       "geometry": [{"name": "box", "type": "cube", "params": {"width": 10, "height": 10, "depth": 10},
+#                     "deleteFaces": [4], "materials": {"redLambert": [0]}}]
+#   }
+# Geometry params are the attributes of the polyPlane/polyCube node, or the arguments of
+# BackdropMesh.BackdropArrays for a backdrop. Materials map a material of the
+# spec to the faces it goes on, counted after deleteFaces.
+# This file only reads and checks specs, so it runs without Maya:
+#   python SceneSpec.py specs/cornellBox.json
+# SceneBuilder.BuildScene turns a spec into a scene.
+
+specDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "specs")
+
+lightTypes = ("aiAreaLight", "aiSkyDomeLight")
+materialTypes = ("lambert", "blinn", "phong", "aiStandardSurface")
+
+# Geometry types with the params they take and their defaults
+geometryParams = {
+    "plane": {"width": 1.0, "height": 1.0, "subdivisionsWidth": 1, "subdivisionsHeight": 1},
+    "cube": {"width": 1.0, "height": 1.0, "depth": 1.0},
+    "backdrop": {"width": 20.0, "floorDepth": 20.0, "wallHeight": 15.0, "coveRadius": 3.0, "segments": 12,
+                 "widthSegments": 1, "thickness": 0.2},
+}
+
+transformKeys = ("translate", "rotate", "scale")
+
+# The name of a spec goes in the name of its cached file and is the namespace it is referenced under
+specNamePattern = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+''' Path of a spec shipped with the templates, by name '''
+def SpecPath(name):
+    return os.path.join(specDir, name + ".json")
+
+def IsNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def IsVector(value):
+    return isinstance(value, list) and len(value) == 3 and all(IsNumber(item) for item in value)
+
+''' Problems with the transform and attributes of a light or geometry entry '''
+def CheckTransform(entry, where):
+    errors = []
+    for key in transformKeys:
+        if key in entry and not IsVector(entry[key]):
+            errors.append(f"{where}: {key} should be a list of 3 numbers")
+    return errors
+
+def CheckAttributes(entry, where):
+    attributes = entry.get("attributes", {})
+    if not isinstance(attributes, dict):
+        return [f"{where}: attributes should be an object"]
+
+    errors = []
+    for attrName, value in attributes.items():
+        if not (IsNumber(value) or isinstance(value, (bool, str)) or IsVector(value)):
+            errors.append(f"{where}: attribute {attrName} should be a number, bool, string or list of 3 numbers")
+    return errors
+
+''' Problems with the params of a backdrop, the cove has to fit on the floor and the wall '''
+def CheckBackdrop(params, where):
+    if not all(IsNumber(value) for value in params.values()):
+        return []
+
+    errors = []
+    for param in ("width", "floorDepth", "wallHeight", "coveRadius", "thickness"):
+        if params[param] <= 0:
+            errors.append(f"{where}: param {param} should be more than 0")
+    for param in ("segments", "widthSegments"):
+        if not isinstance(params[param], int) or params[param] < 1:
+            errors.append(f"{where}: param {param} should be a whole number of at least 1")
+    if params["coveRadius"] > min(params["floorDepth"], params["wallHeight"]):
+        errors.append(f"{where}: coveRadius should fit on the floor and the wall")
+    return errors
+
+''' Every problem with a spec, an empty list when it is fine '''
+def ValidateSceneSpec(spec):
+    if not isinstance(spec, dict):
+        return ["spec should be an object"]
+
+    errors = []
+    for key in spec:
+        if key not in ("name", "lights", "materials", "geometry"):
+            errors.append(f"unknown key {key}")
+    if "name" in spec and not (isinstance(spec["name"], str) and specNamePattern.match(spec["name"])):
+        errors.append("name should be a word of letters, digits and underscores")
+
+    names = set()
+    sections = {}
+    for section in ("lights", "materials", "geometry"):
+        entries = spec.get(section, [])
+        if not isinstance(entries, list):
+            errors.append(f"{section} should be a list")
+            entries = []
+        sections[section] = entries
+
+        for index, entry in enumerate(entries):
+            where = f"{section}[{index}]"
+            if not isinstance(entry, dict):
+                errors.append(f"{where}: should be an object")
+                continue
+
+            name = entry.get("name")
+            if not isinstance(name, str) or not name:
+                errors.append(f"{where}: needs a name")
+            elif name in names:
+                errors.append(f"{where}: name {name} is used twice")
+            else:
+                names.add(name)
+
+    for index, light in enumerate(sections["lights"]):
+        if not isinstance(light, dict):
+            continue
+        where = f"lights[{index}]"
+        if light.get("type") not in lightTypes:
+            errors.append(f"{where}: type should be one of {', '.join(lightTypes)}")
+        errors += CheckTransform(light, where) + CheckAttributes(light, where)
+
+    materialNames = set()
+    for index, material in enumerate(sections["materials"]):
+        if not isinstance(material, dict):
+            continue
+        where = f"materials[{index}]"
+        if material.get("type") not in materialTypes:
+            errors.append(f"{where}: type should be one of {', '.join(materialTypes)}")
+        errors += CheckAttributes(material, where)
+        if isinstance(material.get("name"), str):
+            materialNames.add(material["name"])
+
+    for index, geometry in enumerate(sections["geometry"]):
+        if not isinstance(geometry, dict):
+            continue
+        where = f"geometry[{index}]"
+        geometryType = geometry.get("type")
+        params = geometry.get("params", {})
+        if geometryType not in geometryParams:
+            errors.append(f"{where}: type should be one of {', '.join(geometryParams)}")
+        if not isinstance(params, dict):
+            errors.append(f"{where}: params should be an object")
+        elif geometryType in geometryParams:
+            for param, value in params.items():
+                if param not in geometryParams[geometryType]:
+                    errors.append(f"{where}: {geometryType} has no param {param}")
+                elif not IsNumber(value):
+                    errors.append(f"{where}: param {param} should be a number")
+            if geometryType == "backdrop":
+                errors += CheckBackdrop(dict(geometryParams["backdrop"], **params), where)
+        errors += CheckTransform(geometry, where)
+
+        deleteFaces = geometry.get("deleteFaces", [])
+        if not isinstance(deleteFaces, list) or not all(isinstance(face, int) for face in deleteFaces):
+            errors.append(f"{where}: deleteFaces should be a list of face indices")
+
+        materials = geometry.get("materials", {})
+        if not isinstance(materials, dict):
+            errors.append(f"{where}: materials should be an object")
+            materials = {}
+        for materialName, faces in materials.items():
+            if materialName not in materialNames:
+                errors.append(f"{where}: material {materialName} is not in the spec")
+            if not isinstance(faces, list) or not all(isinstance(face, int) for face in faces):
+                errors.append(f"{where}: faces of {materialName} should be a list of face indices")
+
+    return errors
+
+''' Load a spec from a file, or a spec shipped with the templates by name. Raises ValueError when it is not valid. '''
+def LoadSceneSpec(path):
+    if not os.path.exists(path):
+        path = SpecPath(path)
+    with open(path) as specFile:
+        spec = json.load(specFile)
+
+    errors = ValidateSceneSpec(spec)
+    if errors:
+        raise ValueError(f"Scene spec {path} is not valid:\n  " + "\n  ".join(errors))
+    return spec
+
+''' Hash of everything that decides what a built spec looks like, the version being that of the builder '''
+def SpecHash(spec, version=0):
+    data = json.dumps({"spec": spec, "version": version}, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+''' Params of a geometry entry with the defaults filled in '''
+def GeometryParams(geometry):
+    return dict(geometryParams[geometry["type"]], **geometry.get("params", {}))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Check scene specs without Maya.")
+    parser.add_argument("specs", nargs="+", help="spec files to check")
+    options = parser.parse_args(args)
+
+    failed = 0
+    for path in options.specs:
+        try:
+            spec = LoadSceneSpec(path)
+        except (ValueError, OSError) as error:
+            print(error)
+            failed += 1
+            continue
+        print(f"{path}: {len(spec.get('lights', []))} lights, {len(spec.get('materials', []))} materials, "
+              f"{len(spec.get('geometry', []))} geometry")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
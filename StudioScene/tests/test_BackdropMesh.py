@@ -0,0 +1,65 @@
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+# The scene modules import each other by name, from the StudioScene folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BackdropMesh
+
+
+''' Directed edges of every face, from each corner to the next '''
+def faceEdges(faceCounts, faceConnects):
+    edges = []
+    start = 0
+    for count in faceCounts:
+        face = faceConnects[start:start + count]
+        edges.extend(zip(face, np.roll(face, -1)))
+        start += count
+    return [(int(a), int(b)) for a, b in edges]
+
+''' Signed volume of a closed mesh, positive when the faces point out '''
+def meshVolume(points, faceCounts, faceConnects):
+    volume = 0.0
+    start = 0
+    for count in faceCounts:
+        face = points[faceConnects[start:start + count]]
+        for index in range(1, count - 1):
+            volume += np.dot(face[0], np.cross(face[index], face[index + 1])) / 6.0
+        start += count
+    return volume
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"widthSegments": 4, "segments": 3},
+    {"floorDepth": 6.0, "wallHeight": 3.0, "coveRadius": 3.0},
+    {"thickness": 1.0, "coveRadius": 0.5},
+])
+def test_closedManifold(params):
+    points, faceCounts, faceConnects, uvs = BackdropMesh.BackdropArrays(**params)
+    edges = faceEdges(faceCounts, faceConnects)
+
+    # Every edge is used once in each direction: no holes, no edge on more than two faces, and
+    # neighbouring faces wound the same way
+    directed = Counter(edges)
+    assert max(directed.values()) == 1
+    assert all((b, a) in directed for a, b in edges)
+
+    assert len(faceConnects) == faceCounts.sum()
+    assert faceConnects.max() < len(points)
+    assert len(uvs) == len(points)
+    assert meshVolume(points, faceCounts, faceConnects) > 0
+
+def test_volumeOfThinBackdrop():
+    width, floorDepth, wallHeight, coveRadius, thickness = 20.0, 20.0, 15.0, 3.0, 0.2
+    points, faceCounts, faceConnects, _ = BackdropMesh.BackdropArrays(width, floorDepth, wallHeight, coveRadius,
+                                                                      segments=64, thickness=thickness)
+
+    # About the length of the profile times the thickness, swept across the width
+    profileLength = floorDepth + wallHeight - 2 * coveRadius + 0.5 * np.pi * coveRadius
+    expected = width * profileLength * thickness
+    assert meshVolume(points, faceCounts, faceConnects) == pytest.approx(expected, rel=0.02)
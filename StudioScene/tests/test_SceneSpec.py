@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# The scene modules import each other by name, from the StudioScene folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SceneSpec
+
+
+def validSpec():
+    return {"name": "box",
+            "lights": [{"name": "keyLight", "type": "aiAreaLight", "translate": [0, 10, 0], "attributes": {"intensity": 2.0}}],
+            "materials": [{"name": "red", "type": "lambert", "attributes": {"color": [1, 0, 0]}}],
+            "geometry": [{"name": "floor", "type": "plane", "params": {"width": 10}, "materials": {"red": [0]}},
+                         {"name": "cyc", "type": "backdrop", "params": {"coveRadius": 2}}]}
+
+
+@pytest.mark.parametrize("name", ["cornellBox", "openEnvironment", "studio"])
+def test_shippedSpecsLoad(name):
+    spec = SceneSpec.LoadSceneSpec(name)
+    assert SceneSpec.ValidateSceneSpec(spec) == []
+
+def test_validSpec():
+    assert SceneSpec.ValidateSceneSpec(validSpec()) == []
+
+@pytest.mark.parametrize("spec", [
+    [],
+    "spec",
+    {"lights": {}},
+    {"lights": ["light"]},
+    {"name": ""},
+    {"name": {"a": 1}},
+    {"name": "two words"},
+    {"materials": [{"name": {"a": 1}, "type": "lambert"}]},
+    {"materials": [{"name": ["a"], "type": "lambert"}]},
+    {"materials": [{"name": "red", "type": "lambert", "attributes": []}]},
+    {"lights": [{"name": "key", "type": "aiAreaLight", "translate": [0, 1]}]},
+    {"geometry": [{"name": "box", "type": "cube", "params": []}]},
+    {"geometry": [{"name": "box", "type": "cube", "params": {"width": "wide"}}]},
+    {"geometry": [{"name": "box", "type": "torus"}]},
+    {"geometry": [{"name": "box", "type": "cube", "materials": ["red"]}]},
+    {"geometry": [{"name": "box", "type": "cube", "materials": {"red": [0]}}]},
+    {"geometry": [{"name": "box", "type": "cube", "deleteFaces": [0.5]}]},
+    {"geometry": [{"name": "cyc", "type": "backdrop", "params": {"coveRadius": 50}}]},
+    {"geometry": [{"name": "cyc", "type": "backdrop", "params": {"segments": 0}}]},
+    {"lights": [{"name": "a", "type": "aiAreaLight"}], "geometry": [{"name": "a", "type": "cube"}]},
+])
+def test_malformedSpecs(spec):
+    errors = SceneSpec.ValidateSceneSpec(spec)
+    assert errors
+    assert all(isinstance(error, str) for error in errors)
+
+def test_loadRaisesValueError(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text('{"materials": [{"name": {"a": 1}, "type": "lambert"}]}')
+    with pytest.raises(ValueError):
+        SceneSpec.LoadSceneSpec(str(path))
+
+def test_specHash():
+    spec = validSpec()
+    reordered = dict(reversed(list(spec.items())))
+    changed = validSpec()
+    changed["geometry"][0]["params"]["width"] = 11
+
+    assert SceneSpec.SpecHash(spec, 2) == SceneSpec.SpecHash(reordered, 2)
+    assert SceneSpec.SpecHash(spec, 2) != SceneSpec.SpecHash(spec, 3)
+    assert SceneSpec.SpecHash(spec, 2) != SceneSpec.SpecHash(changed, 2)
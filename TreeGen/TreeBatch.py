@@ -0,0 +1,155 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import TreeGeometry as geo
+from TreeCache import TreeCache
+
+# Headless batch generation of many trees at once.
+# Takes a JSON file with a list of tree specs, for example
+#   [{"name": "oak01", "branchHeight": 15, "subdivsHeight": 10, "twigCount": 15, "leafCount": 20, "seed": 1}]
+# and builds them on a pool of worker processes, one output file per tree.
+# A spec can also have a "leafSpacing" for blue noise leaves and a "position" to place the tree at.
+#
+# Modes:
+#   maya     - every worker is a standalone mayapy process, trees are saved as .mb files
+#   geometry - stand-in that only runs the NumPy engine, trees are saved as .npz files.
+#              Needs no Maya (or Maya licence) at all, useful for testing the pipeline.
+#
+# Example:
+#   python TreeBatch.py forest.json -o out --mode maya --mayapy "C:/Program Files/Autodesk/Maya2025/bin/mayapy.exe"
+
+# Defaults for anything a spec leaves out, the same as the UI sliders
+defaultSpec = {"branchHeight": 15, "subdivsHeight": 10, "twigCount": 15, "leafCount": 20, "seed": None}
+
+
+''' Fill in defaults and a name for every spec '''
+def loadSpecs(path):
+    with open(path) as specFile:
+        specs = json.load(specFile)
+
+    result = []
+    for index, spec in enumerate(specs):
+        full = dict(defaultSpec, **spec)
+        full.setdefault("name", "tree%04d" % index)
+        result.append(full)
+    return result
+
+
+''' Runs once in every mayapy worker, so Maya only starts up once per process '''
+def initMayaWorker():
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+
+
+''' Geometry of one spec in the NumPy engine, moved to its position.
+With a cache, seeded trees that were built before are loaded from there. '''
+def generateSpecTree(spec, cache=None):
+    params = (spec["branchHeight"], spec["subdivsHeight"], spec["twigCount"], spec["leafCount"])
+    options = {"leafSpacing": spec["leafSpacing"]} if spec.get("leafSpacing") else {}
+    if cache:
+        tree = cache.generateTreeGeometry(*params, seed=spec["seed"], **options)
+    else:
+        tree = geo.generateTreeGeometry(*params, rng=geo.makeRng(spec["seed"]), **options)
+
+    offset = np.asarray(spec.get("position", (0.0, 0.0, 0.0)), dtype=np.float64)
+    if offset.any():
+        tree = {key: geo.MeshData(mesh.points + offset, mesh.faceCounts, mesh.faceConnects, mesh.uvs, mesh.uvIds)
+                for key, mesh in tree.items()}
+    return tree
+
+
+''' Build one tree in the NumPy engine and save the arrays, no Maya needed.
+With a cache folder, seeded trees that were built before are loaded from there. '''
+def buildGeometryTree(spec, outputDir, cacheDir=None):
+    tree = generateSpecTree(spec, TreeCache(cacheDir) if cacheDir else None)
+
+    path = os.path.join(outputDir, spec["name"] + ".npz")
+    np.savez_compressed(path, **geo.treeToArrays(tree))
+
+    return path, sum(mesh.numFaces() for mesh in tree.values())
+
+
+''' Build one tree in a fresh Maya scene and save it '''
+def buildMayaTree(spec, outputDir, singleMesh):
+    import maya.cmds as cmds
+    import TreeGenerator
+
+    cmds.file(new=True, force=True)
+
+    TreeGenerator.generateEntireTree(spec["branchHeight"], spec["subdivsHeight"], spec["twigCount"], spec["leafCount"],
+                                     singleMesh=singleMesh, instancedLeaves=True, seed=spec["seed"],
+                                     leafSpacing=spec.get("leafSpacing"))
+
+    # Everything the tree is made of sits at the top of the scene, next to the default cameras
+    if "position" in spec:
+        nodes = [node for node in cmds.ls(assemblies=True) if not cmds.listRelatives(node, shapes=True, type="camera")]
+        cmds.move(*spec["position"], nodes, relative=True)
+
+    path = os.path.join(outputDir, spec["name"] + ".mb")
+    cmds.file(rename=path)
+    cmds.file(save=True, type="mayaBinary", force=True)
+
+    return path, sum(cmds.polyEvaluate(mesh, face=True) for mesh in cmds.ls(type="mesh", noIntermediate=True))
+
+
+''' Worker entry point, returns what was written and how long it took '''
+def buildTree(spec, outputDir, mode, singleMesh=True, cacheDir=None):
+    start = time.perf_counter()
+    if mode == "maya":
+        path, faces = buildMayaTree(spec, outputDir, singleMesh)
+    else:
+        path, faces = buildGeometryTree(spec, outputDir, cacheDir)
+    return spec["name"], path, faces, time.perf_counter() - start
+
+
+''' Farm the specs out to a pool of worker processes and report the throughput '''
+def generateForest(specs, outputDir, mode="geometry", workers=None, mayapy=None, singleMesh=True, cacheDir=None):
+    os.makedirs(outputDir, exist_ok=True)
+
+    # Spawn, so workers don't inherit anything from this process.
+    # In Maya mode the workers are started with mayapy instead of this interpreter.
+    context = multiprocessing.get_context("spawn")
+    initializer = None
+    if mode == "maya":
+        if mayapy:
+            context.set_executable(mayapy)
+        initializer = initMayaWorker
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer) as pool:
+        futures = [pool.submit(buildTree, spec, outputDir, mode, singleMesh, cacheDir) for spec in specs]
+        for future in as_completed(futures):
+            name, path, faces, seconds = future.result()
+            results.append((name, path, faces, seconds))
+            print("%-20s %8d faces %8.2fs  %s" % (name, faces, seconds, path))
+
+    elapsed = time.perf_counter() - start
+    print("Generated %d trees in %.2fs, %.2f trees/s" % (len(results), elapsed, len(results) / elapsed if elapsed else 0.0))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Generate a batch of trees without the UI.")
+    parser.add_argument("specs", help="JSON file with a list of tree specs")
+    parser.add_argument("-o", "--output", default="trees", help="directory to write one file per tree to")
+    parser.add_argument("--mode", choices=("maya", "geometry"), default="geometry",
+                        help="maya builds scenes in mayapy workers, geometry only runs the NumPy engine")
+    parser.add_argument("--mayapy", help="path to mayapy, used to start the workers in maya mode")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="amount of worker processes")
+    parser.add_argument("--per-node", action="store_true", help="maya mode: build a node per part instead of a single mesh")
+    parser.add_argument("--cache", help="geometry mode: tree cache folder to reuse seeded trees from")
+    options = parser.parse_args(args)
+
+    generateForest(loadSpecs(options.specs), options.output, options.mode, options.workers,
+                   options.mayapy, singleMesh=not options.per_node, cacheDir=options.cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import TreeGeometry as geo
+import TreeWind
+
+# Benchmarks for the Maya-free parts of the tree generator.
+# Run with a regular Python interpreter (or mayapy) from the TreeGen folder:
+#   python TreeBenchmark.py
+
+
+''' Time a function, returns the best of a few runs in seconds '''
+def timeIt(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+''' The edge loop center calculation the way generatePoints used to do it, one vertex at a time '''
+def loopCentersLoop(vertices, loops, subDivsA):
+    loopCenterPoints = []
+    for x in range(loops):
+        loopVertices = []
+        index = int(subDivsA * x)
+        for y in range(subDivsA):
+            loopVertices.append(vertices[index + y])
+        cPoints = [0.0, 0.0, 0.0]
+        for z in loopVertices:
+            cPoints = [cPoints[0] + z[0], cPoints[1] + z[1], cPoints[2] + z[2]]
+        loopCenterPoints.append([c / subDivsA for c in cPoints])
+    return loopCenterPoints
+
+
+''' Compare the per vertex loop with the NumPy path on meshes of 10^2 to 10^6 vertices '''
+def benchmarkLoopCenters(subDivsA=20):
+    print("Edge loop centers (subdivsAxis=%d)" % subDivsA)
+    print("%10s %12s %12s %10s" % ("vertices", "loop (ms)", "numpy (ms)", "speedup"))
+
+    for exponent in range(2, 7):
+        loops = max(1, 10 ** exponent // subDivsA)
+        flat = np.random.default_rng(0).random(loops * subDivsA * 3)
+
+        # The loop got a list of vectors from getPoints, the NumPy path gets the flat buffer
+        vertices = flat.reshape(-1, 3).tolist()
+
+        loopTime = timeIt(loopCentersLoop, vertices, loops, subDivsA)
+        numpyTime = timeIt(geo.loopCenters, flat, subDivsA, loops)
+
+        print("%10d %12.3f %12.3f %9.1fx" % (loops * subDivsA, loopTime * 1000, numpyTime * 1000, loopTime / numpyTime))
+
+
+''' Time the recursive engine at every depth, with the segment count and the size of the wood points '''
+def benchmarkRecursiveTree(maxDepth=6, leafCount=10):
+    print("Recursive tree (leafCount=%d)" % leafCount)
+    print("%6s %10s %10s %10s %10s %10s" % ("depth", "segments", "faces", "leaves", "points MB", "time (ms)"))
+
+    for depth in range(1, maxDepth + 1):
+        tree = geo.generateRecursiveTree(depth, leafCount, rng=0)
+        seconds = timeIt(geo.generateRecursiveTree, depth, leafCount, None, 0)
+
+        # Segments per generation multiply with the children per segment
+        counts = [generation["count"] for generation in geo.recursiveGenerations(depth)]
+        segments = int(np.sum(np.cumprod(counts)))
+
+        print("%6d %10d %10d %10d %10.2f %10.1f" % (depth, segments, tree["wood"].numFaces(), tree["leaf"].numFaces(),
+                                                    tree["wood"].points.nbytes / 1e6, seconds * 1000))
+
+
+''' Time baking the wind of a tree and reading it back a frame at a time, the way playback does '''
+def benchmarkWind(frameCount=240, twigCounts=(15, 60, 240)):
+    print("Wind bake (%d frames)" % frameCount)
+    print("%8s %10s %10s %14s" % ("twigs", "vertices", "bake (s)", "frame read (us)"))
+
+    directory = os.path.join(tempfile.gettempdir(), "treeWindBenchmark")
+    for twigCount in twigCounts:
+        parts = geo.generateTreeParts(15, 10, twigCount, 20, rng=0)
+
+        start = time.perf_counter()
+        tree = TreeWind.bakeWind(parts, directory, frameCount, rng=0)
+        bakeTime = time.perf_counter() - start
+
+        cache = TreeWind.WindCache(directory)
+        start = time.perf_counter()
+        for frame in range(frameCount):
+            for key in cache.meshes:
+                cache.frame(key, frame)
+        readTime = (time.perf_counter() - start) / frameCount
+
+        vertices = sum(mesh.numVertices() for mesh in tree.values())
+        print("%8d %10d %10.3f %14.1f" % (twigCount, vertices, bakeTime, readTime * 1e6))
+
+
+''' Time blue noise sampling on 10^3 to 10^5 candidates, the grid keeps it linear '''
+def benchmarkPoissonDisk(minDistance=0.5):
+    print("Blue noise sampling (minDistance=%.2f)" % minDistance)
+    print("%10s %10s %10s %14s" % ("candidates", "kept", "time (ms)", "per point (us)"))
+
+    for exponent in range(3, 6):
+        count = 10 ** exponent
+
+        # Same density for every size, so the kept fraction stays about the same
+        side = (count / 1000.0) ** (1.0 / 3.0) * 5.0
+        points = np.random.default_rng(0).random((count, 3)) * side
+
+        kept = len(geo.poissonDiskSample(points, minDistance, rng=0))
+        seconds = timeIt(geo.poissonDiskSample, points, minDistance, repeat=1)
+        print("%10d %10d %10.1f %14.2f" % (count, kept, seconds * 1000, seconds / count * 1e6))
+
+
+if __name__ == "__main__":
+    benchmarkLoopCenters()
+    print("")
+    benchmarkRecursiveTree()
+    print("")
+    benchmarkWind()
+    print("")
+    benchmarkPoissonDisk()
@@ -0,0 +1,125 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import TreeGeometry as geo
+
+# On-disk cache of generated tree geometry.
+# Entries are keyed by a hash of the tree parameters, the seed and TreeGeometry.generatorVersion,
+# so only seeded trees can be cached. Every entry is a folder with one .npy file per array,
+# which is memory-mapped when loaded instead of read and rebuilt.
+# When the cache grows past maxBytes the least recently used entries are removed.
+# Several processes can share one cache (TreeBatch workers do), entries are written to a folder of
+# their own and moved into place in one step, and anything can disappear while it is being looked at.
+
+# Options of generateTreeGeometry with their defaults. Options at their default are left out of the key,
+# so a tree is cached under the same key whether the default was passed in or not.
+defaultOptions = {name: parameter.default for name, parameter in inspect.signature(geo.generateTreeGeometry).parameters.items()
+                  if parameter.default is not inspect.Parameter.empty and name != "rng"}
+
+
+''' Hash of everything that decides what a tree looks like '''
+def cacheKey(params, seed):
+    data = json.dumps({"params": params, "seed": seed, "version": geo.generatorVersion}, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class TreeCache(object):
+
+    def __init__(self, directory, maxBytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def entryPath(self, key):
+        return os.path.join(self.directory, key)
+
+    ''' Load a cached tree as a dict of MeshData, or None if it is not in the cache '''
+    def get(self, key):
+        path = self.entryPath(key)
+        if not os.path.isdir(path):
+            return None
+
+        # Another process can evict the entry while it is read
+        try:
+            arrays = {}
+            for fileName in os.listdir(path):
+                if fileName.endswith(".npy"):
+                    arrays[fileName[:-4]] = np.load(os.path.join(path, fileName), mmap_mode="r")
+
+            # The modification time of the folder is the last time it was used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return geo.treeFromArrays(arrays)
+
+    ''' Store a tree, then make room if the cache is over its size '''
+    def put(self, key, tree):
+        path = self.entryPath(key)
+
+        # Write to a temporary folder of its own first, so a half written entry is never picked up
+        # and writers of the same key don't get in each other's way
+        tempPath = tempfile.mkdtemp(prefix=key + ".", suffix=".tmp", dir=self.directory)
+        try:
+            for name, array in geo.treeToArrays(tree).items():
+                np.save(os.path.join(tempPath, name + ".npy"), np.ascontiguousarray(array))
+
+            # The same key is the same tree, so when another process got there first its entry is kept
+            try:
+                os.rename(tempPath, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(tempPath, ignore_errors=True)
+        self.evict()
+
+    ''' Remove the least recently used entries until the cache fits in maxBytes '''
+    def evict(self):
+        entries = []
+        total = 0
+        for key in os.listdir(self.directory):
+            path = self.entryPath(key)
+            if not os.path.isdir(path) or key.endswith(".tmp"):
+                continue
+
+            # Entries can be removed by another process while they are looked at
+            try:
+                size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for key in os.listdir(self.directory):
+            shutil.rmtree(self.entryPath(key), ignore_errors=True)
+
+    ''' Cached version of TreeGeometry.generateTreeGeometry. Unseeded trees are never cached,
+    since they are different every time. '''
+    def generateTreeGeometry(self, branchHeight, subdivsHeight, twigCount, leafCount, seed=None, **kwargs):
+        if seed is None:
+            return geo.generateTreeGeometry(branchHeight, subdivsHeight, twigCount, leafCount, **kwargs)
+
+        options = {name: value for name, value in kwargs.items() if name not in defaultOptions or value != defaultOptions[name]}
+        params = dict(options, branchHeight=branchHeight, subdivsHeight=subdivsHeight,
+                      twigCount=twigCount, leafCount=leafCount)
+        key = cacheKey(params, seed)
+
+        tree = self.get(key)
+        if tree is None:
+            tree = geo.generateTreeGeometry(branchHeight, subdivsHeight, twigCount, leafCount,
+                                            rng=geo.makeRng(seed), **kwargs)
+            self.put(key, tree)
+        return tree
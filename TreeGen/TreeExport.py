@@ -0,0 +1,206 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import TreeGeometry as geo
+from TreeBatch import generateSpecTree, loadSpecs
+from TreeCache import TreeCache
+
+# Export of generated trees straight from the NumPy engine, no Maya scene needed.
+# Meshes are written one chunk at a time as they are generated, so exporting a whole forest
+# only ever holds one tree in memory.
+#
+# Formats, picked on the file extension:
+#   .ply   - binary little endian PLY, positions and faces
+#   .obj   - Wavefront OBJ with uvs, one object per mesh
+#   .trees - NumPy stream, for every mesh its name and the MeshData arrays saved one after the
+#            other with np.save, float32 positions and uvs. Read back with readNumpyStream.
+#
+# Example:
+#   python TreeExport.py forest.json -o forest.ply
+
+
+''' Binary PLY. All vertices have to come before all faces in a PLY file, so the faces are
+streamed to a temporary file next to it and appended when the file is closed. The vertex and face
+counts in the header are written as fixed width placeholders and filled in at the end. '''
+class PlyWriter(object):
+    countWidth = 12
+
+    def __init__(self, path):
+        self.path = path
+        self.vertexCount = 0
+        self.faceCount = 0
+
+        self.file = open(path, "wb")
+        self.faceFile = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+
+        self.file.write(self.header(0, 0))
+
+    def header(self, vertexCount, faceCount):
+        return ("ply\n"
+                "format binary_little_endian 1.0\n"
+                "element vertex %0*d\n"
+                "property float x\n"
+                "property float y\n"
+                "property float z\n"
+                "element face %0*d\n"
+                "property list uchar int vertex_indices\n"
+                "end_header\n" % (self.countWidth, vertexCount, self.countWidth, faceCount)).encode("ascii")
+
+    def write(self, name, mesh):
+        self.file.write(np.ascontiguousarray(mesh.points, dtype="<f4").tobytes())
+
+        # Every face is its corner count as one byte followed by the indices as 4 byte ints
+        counts = mesh.faceCounts
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        faceStarts = np.arange(len(counts)) + 4 * offsets
+        cornerStarts = np.repeat(faceStarts + 1, counts) + 4 * (np.arange(len(mesh.faceConnects)) - np.repeat(offsets, counts))
+
+        buffer = np.empty(len(counts) + 4 * len(mesh.faceConnects), dtype=np.uint8)
+        buffer[faceStarts] = counts
+        indices = (mesh.faceConnects + self.vertexCount).astype("<i4")
+        buffer[cornerStarts[:, None] + np.arange(4)] = indices.view(np.uint8).reshape(-1, 4)
+        self.faceFile.write(buffer.tobytes())
+
+        self.vertexCount += mesh.numVertices()
+        self.faceCount += mesh.numFaces()
+
+    def close(self):
+        self.faceFile.seek(0)
+        shutil.copyfileobj(self.faceFile, self.file)
+        self.faceFile.close()
+
+        self.file.seek(0)
+        self.file.write(self.header(self.vertexCount, self.faceCount))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+''' Wavefront OBJ, every mesh is written as its own object straight away '''
+class ObjWriter(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.vertexCount = 0
+        self.uvCount = 0
+
+        self.file = open(path, "w")
+        self.file.write("# Generated by TreeGen\n")
+
+    def write(self, name, mesh):
+        self.file.write("o %s\n" % name)
+        np.savetxt(self.file, mesh.points, fmt="v %.6f %.6f %.6f")
+        np.savetxt(self.file, mesh.uvs, fmt="vt %.6f %.6f")
+
+        # OBJ indices start at 1 and run on over all objects in the file
+        corners = np.stack([mesh.faceConnects + self.vertexCount, mesh.uvIds + self.uvCount], axis=1) + 1
+        offsets = np.concatenate([[0], np.cumsum(mesh.faceCounts)])
+
+        # Faces with the same amount of corners are written in one go
+        for count in np.unique(mesh.faceCounts):
+            faces = np.flatnonzero(mesh.faceCounts == count)
+            faceCorners = corners[offsets[faces][:, None] + np.arange(count)].reshape(len(faces), -1)
+            np.savetxt(self.file, faceCorners, fmt="f" + " %d/%d" * count)
+
+        self.vertexCount += mesh.numVertices()
+        self.uvCount += len(mesh.uvs)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+''' NumPy stream, the most compact and the fastest to write and read back '''
+class NumpyWriter(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+
+    def write(self, name, mesh):
+        np.save(self.file, np.array(name))
+        np.save(self.file, mesh.points.astype(np.float32))
+        np.save(self.file, mesh.faceCounts)
+        np.save(self.file, mesh.faceConnects)
+        np.save(self.file, mesh.uvs.astype(np.float32))
+        np.save(self.file, mesh.uvIds)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+writers = {".ply": PlyWriter, ".obj": ObjWriter, ".trees": NumpyWriter}
+
+
+''' Read a NumPy stream back one mesh at a time, yields (name, MeshData) '''
+def readNumpyStream(path):
+    with open(path, "rb") as streamFile:
+        size = os.fstat(streamFile.fileno()).st_size
+        while streamFile.tell() < size:
+            name = str(np.load(streamFile))
+            yield name, geo.MeshData(*[np.load(streamFile) for _ in geo.MeshData.__slots__])
+
+
+''' Open a writer for the format of the file extension '''
+def openWriter(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in writers:
+        raise ValueError("Unknown export format '%s', use one of %s" % (extension, ", ".join(sorted(writers))))
+    return writers[extension](path)
+
+
+''' Write (name, MeshData) pairs to a file as they come in, returns the amount of meshes written '''
+def exportMeshes(path, meshes):
+    count = 0
+    with openWriter(path) as writer:
+        for name, mesh in meshes:
+            writer.write(name, mesh)
+            count += 1
+    return count
+
+
+''' Generate the trees of a list of specs one at a time, yields (name, MeshData) per tree part.
+Specs are built the same as in TreeBatch, with their "position" and "leafSpacing". '''
+def forestMeshes(specs, cacheDir=None):
+    cache = TreeCache(cacheDir) if cacheDir else None
+
+    for spec in specs:
+        for key, mesh in generateSpecTree(spec, cache).items():
+            if mesh.numFaces():
+                yield "%s_%s" % (spec["name"], key), mesh
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Export generated trees to a mesh file without Maya.")
+    parser.add_argument("specs", help="JSON file with a list of tree specs, the same as for TreeBatch")
+    parser.add_argument("-o", "--output", default="forest.ply", help="file to write, .ply, .obj or .trees")
+    parser.add_argument("--cache", help="tree cache folder to reuse seeded trees from")
+    options = parser.parse_args(args)
+
+    start = time.perf_counter()
+    count = exportMeshes(options.output, forestMeshes(loadSpecs(options.specs), options.cache))
+    print("Exported %d meshes to %s in %.2fs" % (count, options.output, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,39 @@
 import pymel.core as pm
 import pymel.core.datatypes as dt
 import maya.cmds as cmds
-from random import randint, uniform, choices
+import maya.api.OpenMaya as om
+import numpy as np
+import os
 
 from PySide6 import QtCore
 from PySide6 import QtWidgets
 from pymel.internal.plogging import pymelLogger as log
-import pymel.util.mathutils as math
+
+# Maya-free geometry helpers, from the TreeGen folder (needs to be on the script path)
+import TreeGeometry as geo
+from TreeCache import TreeCache
+import TreeExport
+import TreeWind
 
 # WINDOW DIMENSIONS
 winWidth = 640
 winHeight = 480
 
-# Placeholder variables for nodes
-branchNode = 0
-twigNode = 0
-twigNodes = []
-leafNodes = []
+# Leaf count limits per twig, instanced leaves allow a lot more
+maxLeafCount = 50
+maxInstancedLeafCount = 5000
+
+# Placeholder variables for the generated parts, TreePart records
+branchPart = None
+twigParts = []
+leafParts = []
+leafInstanceNodes = []
+
+# Incremental update state, one entry per twig in the same order as twigParts
+twigAnchors = []        # Index of the branch edge loop the twig sits on
+twigLeafParts = []      # Leaves parented to the twig
+leafCountPerTwig = 0    # Leaves per twig the last time leaves were made, 0 if there are none
+leafHeight = 1.0
 
 # Slider globals
 branchHeightSlider = None
@@ -24,143 +41,198 @@ branchRadiusSlider = None
 subdivsHeightSlider = None
 twigCountSlider = None
 leafCountSlider = None
+seedSlider = None
 
 # Material globals
 woodMaterial = None
 leafMaterial = None
 
+# Build mode globals
+singleMeshCheckBox = None
+instancedLeavesCheckBox = None
+blueNoiseCheckBox = None
+
+# Single mesh trees in the scene as (key, mesh name), the key being "wood" or "leaf"
+treeMeshes = []
+
+# Minimum distance between leaves with blue noise leaf placement on
+leafSpacing = 0.6
+
+# Cache of seeded single mesh trees, created on first use
+treeCache = None
+
+# Baked wind playback, the cache being played and the scriptJob that plays it
+windCache = None
+windJob = None
+
+# Live preview globals
+livePreviewCheckBox = None
+previewTimer = None
+fullBuildTimer = None
+previewSeed = None
+previewDelay = 150      # Milliseconds without slider changes before rebuilding
+proxySubdivsAxis = 6
+proxyMaxLeafCount = 5
+
+''' Use the given value, or read it from the UI when generating from the window '''
+def valueOrSlider(value, slider):
+    return slider.value() if value is None else value
+
+def valueOrCheckBox(value, checkBox):
+    if value is None:
+        return checkBox is not None and checkBox.isChecked()
+    return value
+
+''' NODE HANDLES
+Record of the nodes of one generated part (branch, twig or leaf), looked up once when the part is
+created. The handles stay valid through renames, reparenting and UV mapping, so nothing has to be
+found again with listConnections and the order of the connections doesn't matter. '''
+class TreePart(object):
+    __slots__ = ("node", "nodeHandle", "shapeHandle", "transformHandle", "leafCount")
+    
+    def __init__(self, node):
+        # PyNode of the creation node (PolyCylinder / PolyPlane), for its attributes
+        self.node = node
+        
+        # Leaves asked for on a twig, blue noise can place fewer of them
+        self.leafCount = 0
+        
+        # Right after creation the creation node is connected straight to its mesh
+        shape = cmds.listConnections(node.name() + ".output", type="mesh", shapes=True)[0]
+        shapeObject = getMObject(shape)
+        
+        self.nodeHandle = om.MObjectHandle(getMObject(node.name()))
+        self.shapeHandle = om.MObjectHandle(shapeObject)
+        self.transformHandle = om.MObjectHandle(om.MFnDagNode(shapeObject).parent(0))
+    
+    ''' False once the part has been deleted, by the tool or by hand '''
+    def exists(self):
+        return self.transformHandle.isValid()
+    
+    def transform(self):
+        return om.MFnDagNode(self.transformHandle.object()).fullPathName()
+    
+    def shape(self):
+        return om.MFnDagNode(self.shapeHandle.object()).fullPathName()
+
+''' Get the MObject of a node by name '''
+def getMObject(name):
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getDependNode(0)
+
+''' Delete the transforms of a list of parts in one go, skipping parts that are already gone '''
+def deleteParts(parts):
+    transforms = [part.transform() for part in parts if part.exists()]
+    if transforms:
+        cmds.delete(transforms)
+
 ''' 
 Function to create a branch with a set number of edge loops / subdivs 
-The height and amount of subdivs is set between a certain range by the user inside the UI.
+The height and amount of subdivs is set between a certain range by the user inside the UI,
+or passed in directly when generating without the UI.
 '''
-def createBranch():
-    global branchNode
+def createBranch(branchHeight=None, subdivsHeight=None, rng=None):
+    global branchPart
     
     # Delete previously created branch if there's one
-    if branchNode:
-        tempBranchP = pm.listConnections(branchNode)[0]
-        tempBranchT = pm.listConnections(tempBranchP)[2]
-        pm.delete(tempBranchT)
-        branchNode = 0
+    if branchPart:
+        deleteParts([branchPart])
+        branchPart = None
     
-    branchHeight = branchHeightSlider.value()
-    branchRadius = uniform(0.6, 0.9)
-    subdivsHeight = subdivsHeightSlider.value()
+    branchHeight = valueOrSlider(branchHeight, branchHeightSlider)
+    rng = geo.makeRng(rng)
+    branchRadius = rng.uniform(0.6, 0.9)
+    subdivsHeight = valueOrSlider(subdivsHeight, subdivsHeightSlider)
     
     # Create a cylinder as base for the branch
-    branchNode = pm.nodetypes.PolyCylinder(h=branchHeight, r=branchRadius, sh=subdivsHeight)
-    branchT = pm.listConnections(branchNode)[0]
+    branchPart = TreePart(pm.nodetypes.PolyCylinder(h=branchHeight, r=branchRadius, sh=subdivsHeight))
+    branchT = branchPart.transform()
     
     # UV mapping
     cmds.UVCylindricProjection()
     cmds.polyEditUV(pu=3, pv=0.5, su=1, sv=4) # su / sv - Texture scaling
     cmds.dR_DoCmd('modeObject') # Go back to object selection mode
     
-    # Get amount of faces on the transform node of the branch.
-    # Select the top face to move and rotate the branch to deform the branch.
-    numFaces = branchT.numFaces()
-    pm.select(branchT + ".f[" + str(numFaces - 1) + "]")
-    
-    pm.softSelect(softSelectEnabled=True, ssd=15)
-    
-    randomX = uniform(0, 6)
-    randomY = uniform(0, 6)
-    randomZ = uniform(0, 6)
-    randomRotation = uniform(30, 90)
-    
-    cmds.move(randomX, randomX, randomZ, r=True)
-    pm.rotate(0, 0, randomRotation)
-    cmds.scale(0.4, 1, 0.4, r=True)
+    # Deform the branch by moving and rotating its top face with a falloff
+    deformMesh(branchT, geo.deformBranch, rng)
+    assignMaterials()
         
     log.info("Created branch successfully!")
     
     
-''' GET CENTER POINTS FROM BRANCH '''
-def generatePoints(node, pointList):
-    # Get branchNode transform
-    # List connections twice since the transform component changes index 
-    # after performing UV mapping
-    nodeP = pm.listConnections(node)[0]
-    nodeT = pm.listConnections(nodeP)[2]
+''' Get the MFnMesh of a mesh transform '''
+def getMeshFn(transform):
+    selection = om.MSelectionList()
+    selection.add(str(transform))
+    return om.MFnMesh(selection.getDagPath(0))
+
+''' Deform a mesh from its top face with one of the TreeGeometry deformations.
+All points are read in one getPoints call and written back in one setPoints call,
+nothing in the scene (selection, soft select settings) is used or changed. '''
+def deformMesh(transform, deformFunction, rng):
+    meshFn = getMeshFn(transform)
+    points = np.array(meshFn.getPoints(om.MSpace.kWorld))[:, :3]
+    topFace = list(meshFn.getPolygonVertices(meshFn.numPolygons - 1))
+    
+    points = deformFunction(points, topFace, rng)
+    meshFn.setPoints(om.MPointArray(points.tolist()), om.MSpace.kWorld)
+    
     
+''' GET CENTER POINTS FROM BRANCH
+Reads all the points of the mesh at once as a flat buffer and averages them per edge loop.
+Returns a (loops, 3) array of center points. '''
+def generatePoints(part):
     # Get amount of subdivs on the height and on the axis
-    subdivsH = node.getSubdivisionsHeight()
-    subDivsA = node.getSubdivisionsAxis()
+    subdivsH = part.node.getSubdivisionsHeight()
+    subDivsA = part.node.getSubdivisionsAxis()
     
-    # Define amount of edge loops, create an empty list to append center points of edge loops
-    # and get the vertices of the entire mesh.
+    # One edge loop more than there are subdivs on the height
     loops = subdivsH + 1
-    loopCenterPoints = []
-    vertices = nodeT.getPoints(space="world")
-    
-    # For all the edge loops on the branch...
-    for x in range(loops):
-        # Create an empty list for all vertices per edge loop
-        loopVertices = []
-        # Keep track of the index per loop
-        index = int(subDivsA * x)
-        # For every subdiv on the axis...
-        for y in range(subDivsA):
-            # Append the vertices on each edge loop
-            loopVertices.append(vertices[index + y])
-        # Define a center point vector
-        cPoints = [0, 0, 0]
-        # For every edge loop vertice
-        for z in loopVertices:
-            # Add edge loop vertice vector to the center point vector
-            cPoints += z
-        # Calculate center points per edge loop
-        cPoints = cPoints / subDivsA
-        loopCenterPoints.append(cPoints)
-        pointList.append(cPoints)
+    
+    # Query every vertex position in world space in a single call
+    vertices = cmds.xform(part.transform() + ".vtx[*]", query=True, translation=True, worldSpace=True)
+    
+    return geo.loopCenters(vertices, subDivsA, loops)
 
    
 ''' CREATE TWIGS '''
-def createTwig(centerPoints):
-    global branchNode
-    global twigNodes
-    
-    pointList = []
+def createTwig(centerPoints, twigCount=None, rng=None):
+    # Delete twigs if there are any in the scene already
+    deleteTwigs()
     
-    generatePoints(branchNode, pointList)
+    addTwigs(centerPoints, valueOrSlider(twigCount, twigCountSlider), rng)
     
+    log.info("Created twigs successfully!")
+
+''' Add a number of twigs to the branch, on top of the ones already there '''
+def addTwigs(centerPoints, count, rng=None):
     # Get the transform node of the branch
-    # Is used to to a lerp on twig radius depending on branch height
-    branchP = pm.listConnections(branchNode)[0]
-    branchT = pm.listConnections(branchP)[2]
+    branchT = branchPart.transform()
     
-    # Delete twigs if there are any in the scene already
-    deleteTwigs()
+    # Get the branches' bounding box to make twigs smaller if they are higher up on the branch
+    branchBox = cmds.exactWorldBoundingBox(branchT)
     
-    # Create twig at current center point
-    for x in range(twigCountSlider.value()):
-       
-        # Set a random value between the center points on the branch
-        randomPoint = randint(int(branchNode.getSubdivisionsHeight() / 3), len(centerPoints) - 2) # Randomize all center points except the bottom and top of branch
-        
-        # Create a weightlist for random choices
-        # So the twigs are not created at the bottom and top edge loops
-        weightList = list(range(3, branchNode.getSubdivisionsHeight() + 3))
-        
-        weightList[0] = 0
-        weightList[1] = 0
-        
-        centerPointList = range(0, branchNode.getSubdivisionsHeight())
-            
-        randomPointIndex = choices(centerPointList, weightList, k=1)[0]
-        
-        randomPointIndex = min(randomPointIndex, branchNode.getSubdivisionsHeight() - 2)
-        
-        # print("RAND POINT CHOICES: " + str(randomPointIndex))
+    minPoint = branchBox[1] # Get the Y axis
+    maxPoint = branchBox[4] # Get the Y axis
+    
+    rng = geo.makeRng(rng)
+    
+    # Lay out every twig in one batch first: edge loop, size, radius and rotation.
+    # Twigs are not created at the bottom and top edge loops
+    layout = geo.twigLayout(centerPoints, count, minPoint, maxPoint, rng)
+    if layout is None:
+        log.info("The branch needs more subdivisions to place twigs on.")
+        return
+    
+    # Create twig at its center point
+    for x in range(count):
         
-        # Randomize twig size snd subdivs for twisting and deformation
-        twigRadius = 0.5
-        twigLength = uniform(4, 8)
-        twigSubdivs = uniform(int(twigLength)-1, int(twigLength))
+        twigLength = layout["lengths"][x]
         
-        # Create the twig and get it's transform
-        twigNode = pm.nodetypes.PolyCylinder(r=twigRadius, h=twigLength, sh=twigSubdivs)
-        twigT = pm.listConnections(twigNode)[0]
+        # Create the twig with its final radius and get it's transform
+        twigPart = TreePart(pm.nodetypes.PolyCylinder(r=layout["radii"][x], h=twigLength, sh=int(layout["subdivs"][x])))
+        twigT = twigPart.transform()
          
         # UV mapping
         cmds.UVCylindricProjection()
@@ -172,96 +244,64 @@ def createTwig(centerPoints):
         cmds.move(0, -twigLength * 0.5, 0, twigT + ".scalePivot", twigT + ".rotatePivot", r=True)
         cmds.BakeCustomPivot(twigT)
         
-        # Move the twig to a random center point
-        cmds.move(centerPoints[randomPointIndex].x, centerPoints[randomPointIndex].y, centerPoints[randomPointIndex].z)
-        
-        # Get the twig position on the Y axis
-        twigPosY = pm.xform(twigT, query=True, t=True, ws=True)[1]
-        
-        # Get the branches' bounding box to make twigs smaller if they are higher up on the branch
-        branchBox = branchT.boundingBox()
-        
-        minPoint = branchBox.min()[1] # Get the Y axis
-        maxPoint = branchBox.max()[1] # Get the Y axis
-        
-        # Lerp the points in relation to the branch height and twig's position on the Y axis
-        lerp = math.linmap(maxPoint, minPoint, twigPosY)
-        
-        # Force the lerp to be at least a set value
-        if lerp < 0.2:
-            lerp = 0.2
-        
-        twigRadius *= lerp
+        # Move the twig to its center point
+        cmds.move(*layout["positions"][x], twigT)
         
-        twigNode.setRadius(twigRadius)
-        
-        # Rotate the twigs in random positions
+        # Spin the twig, then tilt it around the world Z axis
         # Forcing rotation order to z, x, y
-        pm.xform(twigT, ro=(0, uniform(0, 359), 0), roo='zxy', eu=True, ws=True, r=True)
-        pm.xform(twigT, ro=(0, 0, 30), roo='zxy', eu=True, ws=True, r=True)   
-        
-        # Get amount of faces on the transform node of the twig.
-        # Select the top face and deform the twig.
-        numFaces = twigT.numFaces()
-        pm.select(twigT + ".f[" + str(numFaces - 1) + "]")
-        
-        # Soft select for deformation
-        pm.softSelect(softSelectEnabled=True, ssd=7.5)
-        
-        deformFactor = uniform(0.2, 0.5)
-        scaleFactor = uniform(0.3, 0.5)
+        cmds.xform(twigT, rotation=(0, layout["yaws"][x], 0), rotateOrder="zxy", euler=True, worldSpace=True, relative=True)
+        cmds.xform(twigT, rotation=(0, 0, 30), rotateOrder="zxy", euler=True, worldSpace=True, relative=True)
         
-        cmds.move(0, deformFactor, deformFactor, r=True)
-        cmds.rotate(0, 0, uniform(0, 75), r=True)
-        
-        # Reset pivot point on twig for scaling
-        cmds.CenterPivot(twigT)
-        
-        cmds.scale(scaleFactor, 1, scaleFactor, r=True)
+        # Deform the twig from its top face, in world space after the rotation
+        deformMesh(twigT, geo.deformTwig, rng)
 
-        # Append the twig node to the twig node list
-        twigNodes.append(twigNode)
-    
-    log.info("Created twigs successfully!")
-    print(centerPoints)
+        # Append the twig to the twig list, and remember where it sits for updates
+        twigParts.append(twigPart)
+        twigAnchors.append(int(layout["anchors"][x]))
+        twigLeafParts.append([])
+        
+        # Twigs added after the leaves were made get leaves of their own straight away
+        if leafCountPerTwig:
+            addLeaves(len(twigParts) - 1, leafCountPerTwig, rng)
+            pm.parent(twigT, branchT)
 
 ''' Generate twigs from branch center point data '''  
-def generateTwigs():
+def generateTwigs(twigCount=None, rng=None):
     
-    global branchNode
-    
-    pointList = []
+    if not branchPart or not branchPart.exists():
+        log.info("No branch found. Generate a branch first.")
+        return
     
-    generatePoints(branchNode, pointList)
+    centerPoints = generatePoints(branchPart)
     
-    # Check if the pointList is not empty
-    if pointList:
+    # Check if there are any center points
+    if len(centerPoints):
         # Create twigs
-        createTwig(pointList)
+        createTwig(centerPoints, twigCount, rng)
+        assignMaterials()
     else:
         log.info("No center points found on branch. Have you created a branch at all?")
 
 ''' Delete all twigs - Called when creating twigs to simply replace them 
     if there are any in the scene already '''   
 def deleteTwigs():
-    global twigNodes
+    global twigParts, twigAnchors, twigLeafParts, leafParts, leafCountPerTwig
     
-    # If twigs are deleted manually, this wont find anything in the list and throw an error
-    # Not necessary to take into account for
-    for twigNode in twigNodes:
-        tempTwigP = pm.listConnections(twigNode)[0]
-        tempTwigT = pm.listConnections(tempTwigP)[2]
-        pm.delete(tempTwigT)
+    # Twigs that were deleted by hand are skipped
+    deleteParts(twigParts)
         
-    # Clear list
-    twigNodes = []
+    # Clear list, leaves parented to the twigs went with them
+    twigParts = []
+    twigAnchors = []
+    twigLeafParts = []
+    leafParts = []
+    leafCountPerTwig = 0
+    deleteInstancedLeaves()
     
-def createLeaves():
-    global branchNode
-    global twigNodes
-    global leafNodes
+def createLeaves(leafCount=None, instanced=None, rng=None, spacing=None):
+    global leafHeight, leafCountPerTwig
     
-    if not twigNodes:
+    if not twigParts:
         log.info("No twigs found. Generate twigs first.")
         return
        
@@ -270,117 +310,358 @@ def createLeaves():
     deleteLeaves()
     
     # Get the transform node of the branch
-    branchP = pm.listConnections(branchNode)[0]
-    branchT = pm.listConnections(branchP)[2]
+    branchT = branchPart.transform()
     
     # Get the value of leaves from slider    
-    leafCount = leafCountSlider.value()
+    leafCount = valueOrSlider(leafCount, leafCountSlider)
     
-    leafWidth = 0.75
-    leafHeight = uniform(1.0, 1.5)
+    rng = geo.makeRng(rng)
+    spacing = leafSpacingValue(spacing)
+    
+    # All leaves as instances of one prototype instead of a node per leaf
+    if valueOrCheckBox(instanced, instancedLeavesCheckBox):
+        createInstancedLeaves(branchT, leafCount, rng, spacing)
+        return
+    
+    leafHeight = rng.uniform(1.0, 1.5)
     
     # Loop through all elements in twig node list
-    for twigNode in twigNodes:
-        
-        # print(twigNode)
-
-        # Create an empty list for the twigs center points.
-        twigPoints = []
-        
-        # Calculate the center points for the twigs.
-        # For placement of leaves, in the same way twigs are placed in the branch
-        generatePoints(twigNode, twigPoints)
-        
-        # Get the transform node of the twig
-        twigP = pm.listConnections(twigNode)[0]
-        twigT = pm.listConnections(twigP)[2]
-        
-        # Get the rotation of the twig in world space
-        twigRotation = pm.xform(twigT, query=True, rotation=True, worldSpace=True)
-        
-        # print("TWIG ROTATION: ", str(twigRotation))
+    for twigIndex, twigPart in enumerate(twigParts):
         
-        # Exclude the bottom edge loop from the selection
-        validPoints = twigPoints[1:]
+        addLeaves(twigIndex, leafCount, rng, spacing)
         
-        # Loop through every leaf
-        for _ in range(leafCount):
+        # Parent twig to branch   
+        pm.parent(twigPart.transform(), branchT)
+    
+    leafCountPerTwig = leafCount
+    assignMaterials()
             
+    log.info("Created leaves successfully!")
+
+''' Minimum distance between leaves, 0 when blue noise placement is off '''
+def leafSpacingValue(spacing=None):
+    if spacing is None:
+        return leafSpacing if valueOrCheckBox(None, blueNoiseCheckBox) else 0
+    return spacing
+
+''' Seed of the tree, a seed of 0 on the slider means random '''
+def seedValue(seed=None):
+    if seed is None and seedSlider is not None:
+        return seedSlider.value() or None
+    return seed
+
+''' Add a number of leaves to one twig, on top of the ones already on it.
+With a spacing the leaves are placed as blue noise, at least spacing away from each other and
+from the leaves already on the twig, which can leave the twig with fewer leaves. '''
+def addLeaves(twigIndex, count, rng=None, spacing=None):
+    rng = geo.makeRng(rng)
+    spacing = leafSpacingValue(spacing)
+    
+    twigPart = twigParts[twigIndex]
+    leafWidth = 0.75
+
+    # Calculate the center points for the twigs.
+    # For placement of leaves, in the same way twigs are placed in the branch
+    twigPoints = generatePoints(twigPart)
+    
+    # Get the transform node of the twig
+    twigT = twigPart.transform()
+    
+    # Get the rotation of the twig in world space
+    twigRotation = pm.xform(twigT, query=True, rotation=True, worldSpace=True)
+    
+    # print("TWIG ROTATION: ", str(twigRotation))
+    
+    # Exclude the bottom edge loop from the selection
+    validPoints = twigPoints[1:]
+    
+    twigRadius = twigPart.node.getRadius()
+    
+    twigPart.leafCount += count
+    
+    # Blue noise: all spots are picked up front out of more candidates than there are leaves
+    if spacing:
+        existing = [cmds.xform(leafPart.transform(), query=True, translation=True, worldSpace=True)
+                    for leafPart in twigLeafParts[twigIndex] if leafPart.exists()]
+        candidates = geo.leafPositions([validPoints], [twigRadius], np.zeros(count * 4, dtype=int), rng)
+        spots = candidates[geo.poissonDiskSample(candidates, spacing, np.zeros(len(candidates)), count, rng,
+                                                 existing or None)]
+        count = len(spots)
+    
+    # Loop through every leaf
+    for x in range(count):
+        
+        if spacing:
+            leafPosition = spots[x]
+        else:
             # Randomly select a center point on the twig
-            randomPoint = choices(validPoints, k=1)[0]
+            randomPoint = validPoints[rng.integers(len(validPoints))]
             
             # Perform a random transform within a small range
-            offset = uniform(1.25, 1.75)
-
-            twigRadius = twigNode.getRadius()
+            offset = rng.uniform(1.25, 1.75)
             
-            offsetXZ = uniform(-twigRadius * offset, twigRadius * offset)
-            offsetY = uniform(0.6, 1.0) * twigRadius
+            offsetXZ = rng.uniform(-twigRadius * offset, twigRadius * offset)
+            offsetY = rng.uniform(0.6, 1.0) * twigRadius
       
             # Set the leaf position around the twig's top
-            leafPosition = [randomPoint.x + offsetXZ, randomPoint.y + offsetY, randomPoint.z + offsetXZ]
-       
-            # print(leafPosition)
-            
-            # Create leaf
-            leafNode = pm.nodetypes.PolyPlane(w=leafWidth, h=leafHeight, sw=1, sh=1)
-            leafT = pm.listConnections(leafNode)[0]
-            # print(leafT)
-            # print(leafNode)
-            
-            # Move it to calculated position
-            cmds.move(leafPosition[0], leafPosition[1], leafPosition[2])
-            
-            # Rotate the leaf to align with the twig's rotation
-            pm.rotate(leafT, twigRotation[0], twigRotation[1], twigRotation[2], r=True)
+            leafPosition = [randomPoint[0] + offsetXZ, randomPoint[1] + offsetY, randomPoint[2] + offsetXZ]
+   
+        # print(leafPosition)
+        
+        # Create leaf
+        leafPart = TreePart(pm.nodetypes.PolyPlane(w=leafWidth, h=leafHeight, sw=1, sh=1))
+        leafT = leafPart.transform()
+        
+        # Move it to calculated position
+        cmds.move(leafPosition[0], leafPosition[1], leafPosition[2])
+        
+        # Rotate the leaf to align with the twig's rotation
+        pm.rotate(leafT, twigRotation[0], twigRotation[1], twigRotation[2], r=True)
 
-            # Parent leaves to twig
-            pm.parent(leafT, twigT)
-            
-            # Rotate after parenting to get variation
-            pm.rotate(leafT, uniform(30, 60), uniform(60, 120), -twigRotation[2])
-            
-            # Append leaves to leaf node list
-            leafNodes.append(leafNode)
+        # Parent leaves to twig
+        pm.parent(leafT, twigT)
         
-        # Parent twig to branch   
+        # Rotate after parenting to get variation
+        pm.rotate(leafT, rng.uniform(30, 60), rng.uniform(60, 120), -twigRotation[2])
+        
+        # Append leaves to leaf list, and to the twig's own list
+        leafParts.append(leafPart)
+        twigLeafParts[twigIndex].append(leafPart)
+                     
+''' INCREMENTAL UPDATES
+Apply only the difference between the sliders and the tree that is already in the scene,
+so an edit costs time in proportion to the change instead of the whole tree. '''
+
+''' Add or remove leaves on every twig until each has leafCount leaves '''
+def updateLeafCount(leafCount=None, rng=None):
+    global leafParts, leafCountPerTwig
+    
+    leafCount = valueOrSlider(leafCount, leafCountSlider)
+    
+    # Instanced leaves are a single node, rebuilding them is already cheap
+    if leafInstanceNodes or not leafCountPerTwig:
+        createLeaves(leafCount, rng=rng)
+        return
+    
+    rng = geo.makeRng(rng)
+    removed = []
+    
+    # Compare against the leaves asked for, not the ones placed, or blue noise would top up every time
+    for twigIndex, leaves in enumerate(twigLeafParts):
+        twigPart = twigParts[twigIndex]
+        if twigPart.leafCount < leafCount:
+            addLeaves(twigIndex, leafCount - twigPart.leafCount, rng)
+        elif len(leaves) > leafCount:
+            removed.extend(leaves[leafCount:])
+            del leaves[leafCount:]
+        twigPart.leafCount = leafCount
+    
+    # Delete all the extra leaves in one go
+    if removed:
+        deleteParts(removed)
+        leafParts = [leafPart for leaves in twigLeafParts for leafPart in leaves]
+    
+    leafCountPerTwig = leafCount
+    log.info("Updated leaves to %d per twig!" % leafCount)
+
+''' Add or remove twigs until there are twigCount of them, the remaining twigs stay as they are '''
+def updateTwigCount(twigCount=None, rng=None):
+    global twigParts, twigAnchors, twigLeafParts, leafParts
+    
+    twigCount = valueOrSlider(twigCount, twigCountSlider)
+    
+    if twigCount > len(twigParts):
+        addTwigs(generatePoints(branchPart), twigCount - len(twigParts), rng)
+    elif twigCount < len(twigParts):
+        # Deleting the twig transforms takes their leaves along, but not the instanced leaves
+        deleteParts(twigParts[twigCount:])
+        deleteInstancedLeaves()
+        
+        twigParts = twigParts[:twigCount]
+        twigAnchors = twigAnchors[:twigCount]
+        twigLeafParts = twigLeafParts[:twigCount]
+        leafParts = [leafPart for leaves in twigLeafParts for leafPart in leaves]
+    
+    log.info("Updated to %d twigs!" % twigCount)
+
+''' Change the branch height and move the existing twigs onto the new center points '''
+def updateBranchHeight(branchHeight=None):
+    branchHeight = valueOrSlider(branchHeight, branchHeightSlider)
+    if branchPart.node.getHeight() == branchHeight:
+        return
+    
+    branchPart.node.setHeight(branchHeight)
+    centerPoints = generatePoints(branchPart)
+    
+    for twigPart, anchor in zip(twigParts, twigAnchors):
+        cmds.xform(twigPart.transform(), translation=list(centerPoints[anchor]), worldSpace=True)
+    
+    log.info("Updated branch height to %d!" % branchHeight)
+
+''' Bring the tree in the scene in line with the sliders, changing only what differs '''
+def updateTree(rng=None):
+    # Nothing to update yet, or a different amount of edge loops which moves every vertex
+    if not branchPart or not branchPart.exists() or branchPart.node.getSubdivisionsHeight() != subdivsHeightSlider.value():
+        generateEntireTree(seed=rng)
+        return
+    
+    rng = geo.makeRng(rng)
+    
+    # Fewer twigs deletes the instanced leaves, they are made again for the twigs that are left
+    instancedLeaves = bool(leafInstanceNodes)
+    
+    updateBranchHeight()
+    updateTwigCount(rng=rng)
+    if leafCountPerTwig or instancedLeaves:
+        updateLeafCount(rng=rng)
+    
+    # New twigs and leaves get their materials
+    assignMaterials()
+    
+''' Create all leaves as copies of one prototype leaf, driven by a single particle instancer.
+Every leaf transform is computed in one batch and written to the particles as whole arrays. '''
+def createInstancedLeaves(branchT, leafCount, rng=None, spacing=0):
+    global leafInstanceNodes
+    
+    twigPoints = []
+    twigRadii = []
+    twigRotations = []
+    
+    for twigPart in twigParts:
+        twigT = twigPart.transform()
+        
+        # Exclude the bottom edge loop, the same as for regular leaves
+        twigPoints.append(generatePoints(twigPart)[1:])
+        twigRadii.append(twigPart.node.getRadius())
+        
+        # World rotation of the twig, without the translation
+        twigMatrix = np.array(cmds.xform(twigT, query=True, matrix=True, worldSpace=True)).reshape(4, 4)
+        twigMatrix[3, :3] = 0.0
+        twigRotations.append(twigMatrix)
+        
+        # Parent twig to branch
         pm.parent(twigT, branchT)
-           
-            
-    log.info("Created leaves successfully!")
+    
+    positions, rotations, scales, _ = geo.leafTransforms(twigPoints, twigRadii, twigRotations, leafCount, rng, spacing)
+    eulerRotations = geo.matrixToEuler(rotations)
+    count = len(positions)
+    
+    # One hidden prototype leaf, the instancer draws the copies
+    leafPrototype = cmds.polyPlane(name="leafPrototype", w=0.75, h=1.0, sw=1, sh=1, ch=False)[0]
+    if leafMaterial:
+        cmds.sets(leafPrototype, edit=True, forceElement=leafMaterial)
+    cmds.setAttr(leafPrototype + ".visibility", False)
+    
+    # One static particle per leaf, all created in a single call
+    particleT, particleShape = cmds.particle(position=positions.tolist(), name="leafParticles")
+    cmds.setAttr(particleShape + ".isDynamic", False)
+    
+    # Per particle rotation and scale, both the current and the initial state
+    for attrName, values in (("leafRotationPP", eulerRotations), ("leafScalePP", scales)):
+        for suffix in ("", "0"):
+            cmds.addAttr(particleShape, longName=attrName + suffix, dataType="vectorArray")
+            cmds.setAttr(particleShape + "." + attrName + suffix, count, *values.tolist(), type="vectorArray")
+    
+    instancer = cmds.particleInstancer(particleShape, addObject=True, object=leafPrototype, name="leafInstancer",
+                                       rotation="leafRotationPP", scale="leafScalePP")
+    
+    leafInstanceNodes = [leafPrototype, particleT, instancer]
+    log.info("Created %d instanced leaves successfully!" % count)
                      
 def deleteLeaves():
-    global leafNodes
+    global leafParts, twigLeafParts, leafCountPerTwig
     
-    # If leaves are deleted manually, this wont find anything in the list and throw an error
-    # Not necessary to take into account for
-    for leafNode in leafNodes:
-        tempLeafT = pm.listConnections(leafNode)[0]
-        pm.delete(tempLeafT)
+    # Leaves that were deleted by hand are skipped
+    deleteParts(leafParts)
         
     # Clear list
-    leafNodes = []
+    leafParts = []
+    twigLeafParts = [[] for _ in twigParts]
+    leafCountPerTwig = 0
+    for twigPart in twigParts:
+        twigPart.leafCount = 0
+    
+    deleteInstancedLeaves()
+
+''' Delete the instanced leaves. They aren't parented under the twigs, so deleting the twigs doesn't take them along '''
+def deleteInstancedLeaves():
+    global leafInstanceNodes
+    
+    # Instanced leaves are only the prototype, the particles and the instancer
+    existing = [node for node in leafInstanceNodes if cmds.objExists(node)]
+    if existing:
+        cmds.delete(existing)
+    leafInstanceNodes = []
             
 ''' Delete all objects in the scene '''          
 def clearScene():
-    global branchNode, twigNodes, leafNodes
+    global branchPart, twigParts, leafParts, leafInstanceNodes, treeMeshes
+    global twigAnchors, twigLeafParts, leafCountPerTwig
+    
+    stopWind()
     
     # Get all deleteable objects in the scene.
     cmds.select(all=True)
     cmds.delete()
-    branchNode = 0
-    twigNodes.clear()
-    leafNodes.clear()
+    branchPart = None
+    twigParts = []
+    leafParts = []
+    leafInstanceNodes = []
+    twigAnchors = []
+    twigLeafParts = []
+    leafCountPerTwig = 0
+    treeMeshes = []
     
     
     log.info("Cleared all objects in scene!")
     
-''' Create a material for the loaded texture '''  
+# Connections from a place2dTexture to a file node, the same as Hypershade makes them
+placeTextureConnections = [("coverage", "coverage"), ("translateFrame", "translateFrame"), ("rotateFrame", "rotateFrame"),
+                           ("mirrorU", "mirrorU"), ("mirrorV", "mirrorV"), ("stagger", "stagger"), ("wrapU", "wrapU"),
+                           ("wrapV", "wrapV"), ("repeatUV", "repeatUV"), ("offset", "offset"), ("rotateUV", "rotateUV"),
+                           ("noiseUV", "noiseUV"), ("vertexUvOne", "vertexUvOne"), ("vertexUvTwo", "vertexUvTwo"),
+                           ("vertexUvThree", "vertexUvThree"), ("vertexCameraOne", "vertexCameraOne"),
+                           ("outUvFilterSize", "uvFilterSize"), ("outUV", "uv")]
+
+''' MATERIAL CACHE
+Shading groups made by createMaterial, keyed by texture path, modification time and transparency.
+Loading the same texture again reuses its shading group instead of making a new network, and a
+changed texture file gets a new one. The key is also stored on the shading group itself, so
+materials are found again in a reopened scene. '''
+materialCache = {}
+
+def materialKey(texturePath, transparent):
+    return "%s|%d|%d" % (os.path.normpath(texturePath), int(os.path.getmtime(texturePath)), bool(transparent))
+
+''' Find the shading group of a key, in the cache or else in the scene '''
+def findMaterial(key):
+    shadingGroup = materialCache.get(key)
+    if shadingGroup and cmds.objExists(shadingGroup):
+        return shadingGroup
+    
+    for shadingGroup in cmds.ls(type="shadingEngine"):
+        if cmds.attributeQuery("treeMaterialKey", node=shadingGroup, exists=True) and \
+                cmds.getAttr(shadingGroup + ".treeMaterialKey") == key:
+            materialCache[key] = shadingGroup
+            return shadingGroup
+    return None
+
+''' Get a plug by its name, for the DG modifier '''
+def getPlug(name):
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getPlug(0)
+
+''' Create a material for the loaded texture, or reuse the one made for it before '''  
 def createMaterial(name, texturePath, transparent):
+    key = materialKey(texturePath, transparent)
+    shadingGroup = findMaterial(key)
+    if shadingGroup:
+        log.info('Material reused!')
+        return shadingGroup
+    
     sNode = cmds.shadingNode('lambert', name='%s_lambert' % name, asShader=True)
     sNodeSG = cmds.sets(name='%sSG' % sNode, empty=True, renderable=True, noSurfaceShader=True)
-    cmds.connectAttr('%s.outColor' % sNode, '%s.surfaceShader' % sNodeSG)
-    #cmds.sets('leaf', e=True, forceElement=sNodeSG)
         
     baseName = os.path.basename(texturePath)
     prefix = baseName.split('.')[0]
@@ -389,30 +670,42 @@ def createMaterial(name, texturePath, transparent):
     cmds.setAttr(fileNode+'.fileTextureName', texturePath, type='string')
         
     placeNode = cmds.shadingNode('place2dTexture',asUtility=True,n=prefix+'_place2dTexture')
-    cmds.connectAttr(placeNode+'.coverage',fileNode+'.coverage',f=True)
-    cmds.connectAttr(placeNode+'.translateFrame',fileNode+'.translateFrame',f=True)
-    cmds.connectAttr(placeNode+'.rotateFrame',fileNode+'.rotateFrame',f=True)
-    cmds.connectAttr(placeNode+'.mirrorU',fileNode+'.mirrorU',f=True)
-    cmds.connectAttr(placeNode+'.mirrorV',fileNode+'.mirrorV',f=True)
-    cmds.connectAttr(placeNode+'.stagger',fileNode+'.stagger',f=True)
-    cmds.connectAttr(placeNode+'.wrapU',fileNode+'.wrapU',f=True)
-    cmds.connectAttr(placeNode+'.wrapV',fileNode+'.wrapV',f=True)
-    cmds.connectAttr(placeNode+'.repeatUV',fileNode+'.repeatUV',f=True)
-    cmds.connectAttr(placeNode+'.offset',fileNode+'.offset',f=True)
-    cmds.connectAttr(placeNode+'.rotateUV',fileNode+'.rotateUV',f=True)
-    cmds.connectAttr(placeNode+'.noiseUV',fileNode+'.noiseUV',f=True)
-    cmds.connectAttr(placeNode+'.vertexUvOne',fileNode+'.vertexUvOne',f=True)
-    cmds.connectAttr(placeNode+'.vertexUvTwo',fileNode+'.vertexUvTwo',f=True)
-    cmds.connectAttr(placeNode+'.vertexUvThree',fileNode+'.vertexUvThree',f=True)
-    cmds.connectAttr(placeNode+'.vertexCameraOne',fileNode+'.vertexCameraOne',f=True)
-    cmds.connectAttr(placeNode+'.outUvFilterSize',fileNode+'.uvFilterSize',f=True)
-    cmds.connectAttr(placeNode+'.outUV',fileNode+'.uv',f=True)
-
-    cmds.connectAttr(fileNode+'.outColor', sNode+'.color', f=True)
+    
+    # Every connection of the network made in a single DG modifier
+    connections = [(placeNode + '.' + source, fileNode + '.' + destination) for source, destination in placeTextureConnections]
+    connections.append((sNode + '.outColor', sNodeSG + '.surfaceShader'))
+    connections.append((fileNode + '.outColor', sNode + '.color'))
     if transparent == True:
-        cmds.connectAttr(fileNode+'.outTransparency', sNode+'.transparency', f=True)
+        connections.append((fileNode + '.outTransparency', sNode + '.transparency'))
+    
+    modifier = om.MDGModifier()
+    for source, destination in connections:
+        modifier.connect(getPlug(source), getPlug(destination))
+    modifier.doIt()
+    
+    cmds.addAttr(sNodeSG, longName="treeMaterialKey", dataType="string")
+    cmds.setAttr(sNodeSG + ".treeMaterialKey", key, type="string")
+    materialCache[key] = sNodeSG
+    
     log.info('Material created!')  
     return sNodeSG
+
+''' Assign the materials to every part of the tree, one sets call per material for all of its parts '''
+def assignMaterials():
+    woodParts = [branchPart] + twigParts if branchPart else list(twigParts)
+    meshes = {"wood": [], "leaf": []}
+    for key, meshName in treeMeshes:
+        if cmds.objExists(meshName):
+            meshes[key].append(meshName)
+    
+    # Instanced leaves all draw the prototype
+    if leafInstanceNodes and cmds.objExists(leafInstanceNodes[0]):
+        meshes["leaf"].append(leafInstanceNodes[0])
+    
+    for material, parts, key in ((woodMaterial, woodParts, "wood"), (leafMaterial, leafParts, "leaf")):
+        nodes = [part.transform() for part in parts if part.exists()] + meshes[key]
+        if material and nodes:
+            cmds.sets(nodes, edit=True, forceElement=material)
     
 ''' Load texture for the branch and the twigs '''    
 def loadWoodTexture():
@@ -420,6 +713,7 @@ def loadWoodTexture():
     filename, _ = QtWidgets.QFileDialog.getOpenFileName(None, "Load wood texture", "")
     if filename:
         woodMaterial = createMaterial("mWood", filename, transparent=False)
+        assignMaterials()
         
     else:
         log.info("Wood texture file is missing or not loaded!")
@@ -430,27 +724,282 @@ def loadLeafTexture():
     filename, _ = QtWidgets.QFileDialog.getOpenFileName(None, "Load leaf texture", "")
     if filename:
         leafMaterial = createMaterial("mLeaf", filename, transparent=True)
+        assignMaterials()
         
     else:
         log.info("Leaf texture file is missing or not loaded!")
         
-''' Generate all the steps in one go '''
-def generateEntireTree():
+''' Create a mesh from TreeGeometry arrays with a single MFnMesh.create call.
+Returns the name of the new transform. '''
+def createMeshFromData(name, meshData, material=None):
+    points = om.MPointArray(meshData.points.tolist())
+    uValues = meshData.uvs[:, 0].tolist()
+    vValues = meshData.uvs[:, 1].tolist()
+    
+    meshFn = om.MFnMesh()
+    meshT = meshFn.create(points, meshData.faceCounts.tolist(), meshData.faceConnects.tolist(), uValues, vValues)
+    meshFn.assignUVs(meshData.faceCounts.tolist(), meshData.uvIds.tolist())
+    
+    meshName = cmds.rename(om.MFnDagNode(meshT).fullPathName(), name)
+    
+    # Fall back on the default material so the mesh doesn't render green
+    cmds.sets(meshName, edit=True, forceElement=material or "initialShadingGroup")
+    return meshName
+
+''' The tree cache lives in the Maya user folder '''
+def getTreeCache():
+    global treeCache
+    if treeCache is None:
+        treeCache = TreeCache(os.path.join(cmds.internalVar(userAppDir=True), "treeCache"))
+    return treeCache
+
+''' Generate the entire tree as one wood mesh and one leaf mesh instead of a node per part.
+Seeded trees are loaded from the tree cache when they have been generated before. '''
+def generateTreeMesh(branchHeight=None, subdivsHeight=None, twigCount=None, leafCount=None, seed=None,
+                     subdivsAxis=20, useCache=True, leafSpacing=None):
+    params = (valueOrSlider(branchHeight, branchHeightSlider), valueOrSlider(subdivsHeight, subdivsHeightSlider),
+              valueOrSlider(twigCount, twigCountSlider), valueOrSlider(leafCount, leafCountSlider))
+    
+    # Only passed on when it's on, so trees without it keep their cache entries
+    options = {"subdivsAxis": subdivsAxis}
+    if leafSpacingValue(leafSpacing):
+        options["leafSpacing"] = leafSpacingValue(leafSpacing)
+    
+    if useCache:
+        tree = getTreeCache().generateTreeGeometry(*params, seed=seed, **options)
+    else:
+        tree = geo.generateTreeGeometry(*params, rng=geo.makeRng(seed), **options)
+    
+    createTreeMeshes(tree)
+
+''' Generate a tree of any depth with the recursive engine, as one wood mesh and one leaf mesh.
+The depth counts the trunk, so a depth of 3 is the same kind of tree as branch, twigs and leaves. '''
+def generateRecursiveTreeMesh(depth=4, leafCount=10, seed=None, generations=None):
+    clearScene()
+    createTreeMeshes(geo.generateRecursiveTree(depth, leafCount, generations, geo.makeRng(seed)))
+
+''' One mesh per material from TreeGeometry arrays, skipping empty ones (no twigs means no leaves).
+A suffix is added to the mesh names, for levels of detail. The meshes of every level are kept
+in treeMeshes until the scene is cleared. '''
+def createTreeMeshes(tree, suffix=""):
+    meshes = []
+    for name, key, material in (("treeWood", "wood", woodMaterial), ("treeLeaves", "leaf", leafMaterial)):
+        if tree[key].numFaces():
+            meshes.append(createMeshFromData(name + suffix, tree[key], material))
+            treeMeshes.append((key, meshes[-1]))
+    
+    log.info("Created tree mesh with %d wood and %d leaf faces!" % (tree["wood"].numFaces(), tree["leaf"].numFaces()))
+    return meshes
+
+''' Generate a tree in a few levels of detail, all made from the same seeded tree.
+Every level is a group with its own wood and leaf mesh, and the groups go in a levelOfDetail group
+that switches between them on the distance to the camera. Returns the name of the lod group. '''
+def generateTreeLods(branchHeight=None, subdivsHeight=None, twigCount=None, leafCount=None, levels=3, seed=None,
+                     lodDistance=50.0, leafSpacing=None):
+    clearScene()
+    
+    seed = seedValue(seed)
+    
+    lods = geo.generateTreeLods(valueOrSlider(branchHeight, branchHeightSlider), valueOrSlider(subdivsHeight, subdivsHeightSlider),
+                                valueOrSlider(twigCount, twigCountSlider), valueOrSlider(leafCount, leafCountSlider),
+                                levels, rng=geo.makeRng(seed), leafSpacing=leafSpacingValue(leafSpacing))
+    
+    lodGroups = []
+    for level, (lod, triangles) in enumerate(zip(lods, geo.lodTriangleCounts(lods))):
+        meshes = createTreeMeshes(lod, "_LOD%d" % level)
+        lodGroups.append(cmds.group(meshes, name="tree_LOD%d" % level))
+        log.info("LOD%d: %d wood and %d leaf triangles" % (level, triangles["wood"], triangles["leaf"]))
+    
+    # Children of the lod group go from high to low detail, switching every lodDistance units
+    # away from the perspective camera
+    lodGroup = cmds.createNode("lodGroup", name="tree_LODs")
+    cmds.parent(lodGroups, lodGroup)
+    cmds.connectAttr("perspShape.worldMatrix[0]", lodGroup + ".cameraMatrix")
+    for level in range(levels - 1):
+        cmds.setAttr(lodGroup + ".threshold[%d]" % level, lodDistance * (level + 1))
+    
+    return lodGroup
+
+''' Export the tree on the sliders straight to a .ply, .obj or .trees file, without building it in the scene.
+Without a path a file dialog asks for one. '''
+def exportTree(path=None, branchHeight=None, subdivsHeight=None, twigCount=None, leafCount=None, seed=None,
+               leafSpacing=None):
+    if path is None:
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(None, "Export tree", "", "Meshes (*.ply *.obj *.trees)")
+        if not path:
+            return
+    
+    seed = seedValue(seed)
+    
+    spec = {"name": os.path.splitext(os.path.basename(path))[0], "seed": seed,
+            "branchHeight": valueOrSlider(branchHeight, branchHeightSlider), "subdivsHeight": valueOrSlider(subdivsHeight, subdivsHeightSlider),
+            "twigCount": valueOrSlider(twigCount, twigCountSlider), "leafCount": valueOrSlider(leafCount, leafCountSlider)}
+    if leafSpacingValue(leafSpacing):
+        spec["leafSpacing"] = leafSpacingValue(leafSpacing)
+    
+    TreeExport.exportMeshes(path, TreeExport.forestMeshes([spec], getTreeCache().directory))
+    log.info("Exported tree to %s" % path)
+
+''' Generate a single mesh tree and bake frameCount frames of wind for it.
+The wind is written to a memory-mapped point cache in the Maya user folder and played back
+by a scriptJob that sets the points of the meshes from the cache on every time change. '''
+def bakeTreeWind(frameCount=240, branchHeight=None, subdivsHeight=None, twigCount=None, leafCount=None, seed=None,
+                 fps=24.0, wind=None, leafSpacing=None):
+    global windCache
+    
+    clearScene()
+    
+    seed = seedValue(seed)
+    rng = geo.makeRng(seed)
+    
+    parts = geo.generateTreeParts(valueOrSlider(branchHeight, branchHeightSlider), valueOrSlider(subdivsHeight, subdivsHeightSlider),
+                                  valueOrSlider(twigCount, twigCountSlider), valueOrSlider(leafCount, leafCountSlider), rng=rng,
+                                  leafSpacing=leafSpacingValue(leafSpacing))
+    
+    directory = os.path.join(cmds.internalVar(userAppDir=True), "treeWind")
+    tree = TreeWind.bakeWind(parts, directory, frameCount, fps, wind, rng=rng)
+    
+    # Mesh per key of the cache, createTreeMeshes skips empty ones
+    keys = [key for key in ("wood", "leaf") if tree[key].numFaces()]
+    meshes = dict(zip(keys, createTreeMeshes(tree)))
+    
+    windCache = TreeWind.WindCache(directory)
+    cmds.playbackOptions(minTime=1, maxTime=frameCount)
+    playWind(meshes)
+    startWind(meshes)
+    
+    log.info("Baked %d frames of wind to %s" % (frameCount, directory))
+
+''' Set the points of the tree meshes to the current frame of the wind cache, one read per mesh '''
+def playWind(meshes):
+    if windCache is None:
+        return
+    
+    # Frame 1 is the first frame of the bake
+    frame = int(round(cmds.currentTime(query=True))) - 1
+    for key, mesh in meshes.items():
+        if cmds.objExists(mesh):
+            getMeshFn(mesh).setPoints(om.MPointArray(windCache.frame(key, frame).tolist()))
+
+def startWind(meshes):
+    global windJob
+    stopWind()
+    windJob = cmds.scriptJob(event=["timeChanged", lambda: playWind(meshes)])
+
+def stopWind():
+    global windJob, windCache
+    if windJob is not None and cmds.scriptJob(exists=windJob):
+        cmds.scriptJob(kill=windJob, force=True)
+    windJob = None
+    windCache = None
+
+''' Generate all the steps in one go.
+Any value left out is read from the UI, so this also works as the API for generating without it.
+The same seed always gives the same tree, no seed gives a new one every time. '''
+def generateEntireTree(branchHeight=None, subdivsHeight=None, twigCount=None, leafCount=None,
+                       singleMesh=None, instancedLeaves=None, seed=None, leafSpacing=None):
     
     clearScene()
     
-    createBranch()
+    seed = seedValue(seed)
+    
+    # Build everything in two meshes, or keep one node per part
+    if valueOrCheckBox(singleMesh, singleMeshCheckBox):
+        generateTreeMesh(branchHeight, subdivsHeight, twigCount, leafCount, seed, leafSpacing=leafSpacing)
+        return
+    
+    # One generator passed through every step
+    rng = geo.makeRng(seed)
+    
+    createBranch(branchHeight, subdivsHeight, rng)
 
-    generateTwigs()
+    generateTwigs(twigCount, rng)
 
-    createLeaves()
+    createLeaves(leafCount, instancedLeaves, rng, leafSpacing)
     
     log.info("Generated all parts of the tree!")
            
 
+''' LIVE PREVIEW
+While a slider is dragged the tree is rebuilt as a cheap proxy (fewer subdivisions, capped leaves),
+and once the slider is released the full tree is built once. valueChanged events are coalesced
+with a debounce timer: every new event restarts the timer, so a rebuild that would already be
+out of date never runs and the window doesn't fall behind the slider. '''
+
+def previewSliders():
+    return [branchHeightSlider, subdivsHeightSlider, twigCountSlider, leafCountSlider, seedSlider]
+
+''' Keep the same tree during a drag, even without a seed set '''
+def previewSeedValue():
+    return seedSlider.value() or previewSeed
+
+def onPreviewToggled(checked):
+    global previewSeed
+    previewTimer.stop()
+    fullBuildTimer.stop()
+    if checked:
+        previewSeed = int(geo.makeRng().integers(1, 10000))
+        fullBuildTimer.start()
+
+def onPreviewSliderPressed():
+    # A new drag makes any pending full build stale
+    fullBuildTimer.stop()
+
+def onPreviewSliderChanged():
+    if not livePreviewCheckBox.isChecked():
+        return
+    
+    fullBuildTimer.stop()
+    if any(slider.isSliderDown() for slider in previewSliders()):
+        previewTimer.start()
+    else:
+        # Changed with the keyboard or a click on the groove, no release will follow
+        fullBuildTimer.start()
+
+def onPreviewSliderReleased():
+    if not livePreviewCheckBox.isChecked():
+        return
+    
+    previewTimer.stop()
+    fullBuildTimer.start()
+
+''' Low resolution single mesh tree, not cached since it is thrown away right after '''
+def buildProxyTree():
+    clearScene()
+    generateTreeMesh(leafCount=min(leafCountSlider.value(), proxyMaxLeafCount), seed=previewSeedValue(),
+                     subdivsAxis=proxySubdivsAxis, useCache=False)
+
+def buildFullTree():
+    # The user grabbed a slider again before this got to run
+    if any(slider.isSliderDown() for slider in previewSliders()):
+        return
+    generateEntireTree(seed=previewSeedValue())
+
+''' Create the debounce timers and hook the sliders up to them '''
+def setupLivePreview():
+    global previewTimer, fullBuildTimer
+    
+    previewTimer = QtCore.QTimer()
+    previewTimer.setSingleShot(True)
+    previewTimer.setInterval(previewDelay)
+    previewTimer.timeout.connect(buildProxyTree)
+    
+    fullBuildTimer = QtCore.QTimer()
+    fullBuildTimer.setSingleShot(True)
+    fullBuildTimer.setInterval(previewDelay)
+    fullBuildTimer.timeout.connect(buildFullTree)
+    
+    for slider in previewSliders():
+        slider.valueChanged.connect(onPreviewSliderChanged)
+        slider.sliderPressed.connect(onPreviewSliderPressed)
+        slider.sliderReleased.connect(onPreviewSliderReleased)
+    
+    livePreviewCheckBox.toggled.connect(onPreviewToggled)
+
 ''' Create UI '''
 def createUI():
-    global win, branchHeightSlider, subdivsHeightSlider, twigCountSlider, leafCountSlider
+    global win, branchHeightSlider, subdivsHeightSlider, twigCountSlider, leafCountSlider, singleMeshCheckBox
+    global instancedLeavesCheckBox, blueNoiseCheckBox, seedSlider, livePreviewCheckBox
     
     win = QtWidgets.QWidget()
     win.resize(winWidth, winHeight)
@@ -477,7 +1026,7 @@ def createUI():
     # BRANCH BUTTON
     btn = QtWidgets.QPushButton("Generate branch")
     layout.addWidget(btn)
-    btn.clicked.connect(createBranch) 
+    btn.clicked.connect(lambda: createBranch()) 
     
     # TWIG SLIDER
     twigCountSlider = addSliderWithLabel(layout, "Twig Count", 1, 30, 15)
@@ -485,19 +1034,61 @@ def createUI():
     # TWIG BUTTON
     twigBtn = QtWidgets.QPushButton("Generate Twigs")
     layout.addWidget(twigBtn)
-    twigBtn.clicked.connect(generateTwigs)
+    twigBtn.clicked.connect(lambda: generateTwigs())
     
     # LEAF SLIDER
-    leafCountSlider = addSliderWithLabel(layout, "Leaf Count", 1, 50, 20)
+    leafCountSlider = addSliderWithLabel(layout, "Leaf Count", 1, maxLeafCount, 20)
+    
+    # Instanced leaves are cheap enough to allow a lot more of them
+    instancedLeavesCheckBox = QtWidgets.QCheckBox("Instanced leaves")
+    layout.addWidget(instancedLeavesCheckBox)
+    instancedLeavesCheckBox.toggled.connect(
+        lambda checked: setSliderMaximum(leafCountSlider, maxInstancedLeafCount if checked else maxLeafCount))
+    
+    # Blue noise keeps leaves apart, the same coverage with fewer of them
+    blueNoiseCheckBox = QtWidgets.QCheckBox("Blue noise leaf spacing")
+    layout.addWidget(blueNoiseCheckBox)
     
     # LEAF BUTTON
     twigBtn = QtWidgets.QPushButton("Generate leaves")
     layout.addWidget(twigBtn)
-    twigBtn.clicked.connect(createLeaves)
+    twigBtn.clicked.connect(lambda: createLeaves())
+    
+    # SEED SLIDER
+    seedSlider = addSliderWithLabel(layout, "Seed (0 = random)", 0, 9999, 0)
+    
+    # BUILD MODE
+    singleMeshCheckBox = QtWidgets.QCheckBox("Build entire tree as a single mesh")
+    layout.addWidget(singleMeshCheckBox)
     
     generateAllBtn = QtWidgets.QPushButton("Generate Entire Tree")
     layout.addWidget(generateAllBtn)
-    generateAllBtn.clicked.connect(generateEntireTree)
+    generateAllBtn.clicked.connect(lambda: generateEntireTree())
+    
+    # LEVELS OF DETAIL, the same tree in 3 levels of detail in a lod group
+    lodBtn = QtWidgets.QPushButton("Generate LODs")
+    layout.addWidget(lodBtn)
+    lodBtn.clicked.connect(lambda: generateTreeLods())
+    
+    # WIND, bakes 240 frames of wind for a single mesh tree and plays them back
+    windBtn = QtWidgets.QPushButton("Bake Wind")
+    layout.addWidget(windBtn)
+    windBtn.clicked.connect(lambda: bakeTreeWind())
+    
+    # EXPORT, writes the tree to a file without building it
+    exportBtn = QtWidgets.QPushButton("Export Tree")
+    layout.addWidget(exportBtn)
+    exportBtn.clicked.connect(lambda: exportTree())
+    
+    # LIVE PREVIEW, rebuilds while the sliders are dragged
+    livePreviewCheckBox = QtWidgets.QCheckBox("Live preview")
+    layout.addWidget(livePreviewCheckBox)
+    setupLivePreview()
+    
+    # UPDATE BUTTON, only applies what changed on the sliders
+    updateBtn = QtWidgets.QPushButton("Update Tree")
+    layout.addWidget(updateBtn)
+    updateBtn.clicked.connect(lambda: updateTree())
     
     # CLEAR SCENE BUTTON
     clearBtn = QtWidgets.QPushButton("Clear Scene")
@@ -520,6 +1111,16 @@ def addSliderWithLabel(layout, labelText, minValue, maxValue, defaultValue):
     layout.addWidget(label)
     layout.addWidget(slider)
     layout.addWidget(rangeLabel)
+    
+    # Keep the label around so the range can be changed later
+    slider.rangeLabel = rangeLabel
     return slider
 
-createUI()
\ No newline at end of file
+''' Change the maximum of a slider made by addSliderWithLabel, and its label '''
+def setSliderMaximum(slider, maxValue):
+    slider.setMaximum(maxValue)
+    slider.rangeLabel.setText(f"Min:  {slider.minimum()}, Max: {maxValue}")
+
+# Only open the window when run as a script, importing the module (e.g. from TreeBatch) doesn't
+if __name__ == "__main__":
+    createUI()
@@ -0,0 +1,704 @@
+import numpy as np
+
+# Pure NumPy geometry helpers for the tree generator.
+# Nothing in here imports Maya, so it can be used (and checked) outside of it.
+
+# Bump whenever a change makes the same parameters and seed give different geometry,
+# so cached trees from older versions are not reused
+generatorVersion = 3
+
+
+''' Random generator for a seed, a seed of None gives a different tree every time.
+An existing generator is passed through as is. '''
+def makeRng(seed=None):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+''' Probabilities for the edge loop a twig starts on, the bottom and top edge loops are left out
+and higher edge loops get a little more twigs. Returns None if there is nowhere to put a twig. '''
+def twigAnchorWeights(subdivsHeight):
+    weightList = np.arange(3, subdivsHeight + 3, dtype=np.float64)
+    weightList[:2] = 0
+    total = weightList.sum()
+    return weightList / total if total else None
+
+'''
+Calculate the center point of every edge loop on a cylinder in one go.
+Takes the points as a flat buffer (x, y, z, x, y, z, ...) or an (N, 3) array,
+ordered the way polyCylinder orders them: one ring of subdivsAxis vertices per loop,
+followed by the cap vertices, which are ignored.
+If loops is not given, every complete ring is counted as an edge loop.
+Returns a (loops, 3) array.
+'''
+def loopCenters(points, subdivsAxis, loops=None):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
+    # Only complete rings count as edge loops, the cap centers are left out
+    if loops is None:
+        loops = points.shape[0] // subdivsAxis
+    rings = points[:loops * subdivsAxis].reshape(loops, subdivsAxis, 3)
+
+    return rings.mean(axis=1)
+
+
+''' Mesh arrays in the layout MFnMesh.create expects '''
+class MeshData(object):
+    __slots__ = ("points", "faceCounts", "faceConnects", "uvs", "uvIds")
+
+    def __init__(self, points, faceCounts, faceConnects, uvs, uvIds):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)  # (N, 3) vertex positions
+        self.faceCounts = np.asarray(faceCounts, dtype=np.int32)           # vertices per face
+        self.faceConnects = np.asarray(faceConnects, dtype=np.int32)       # vertex index per face corner
+        self.uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)        # (U, 2) uv coordinates
+        self.uvIds = np.asarray(uvIds, dtype=np.int32)                     # uv index per face corner
+
+    def numVertices(self):
+        return len(self.points)
+
+    def numFaces(self):
+        return len(self.faceCounts)
+
+    ''' Amount of triangles the mesh turns into, (n - 2) per n-sided face '''
+    def numTriangles(self):
+        return int(np.sum(self.faceCounts - 2))
+
+
+''' MATRICES
+Maya style row vector matrices, a point is transformed as [x, y, z, 1] @ M.
+Every function takes scalars or arrays of angles in degrees and returns (..., 4, 4). '''
+def identityMatrices(count=None):
+    if count is None:
+        return np.eye(4)
+    return np.tile(np.eye(4), (count, 1, 1))
+
+
+def rotationMatrices(axis, degrees):
+    radians = np.radians(np.asarray(degrees, dtype=np.float64))
+    cos = np.cos(radians)
+    sin = np.sin(radians)
+
+    matrices = np.zeros(radians.shape + (4, 4))
+    matrices[..., 3, 3] = 1.0
+
+    # Indices of the two axes that rotate into each other, the third stays put
+    a, b = {"x": (1, 2), "y": (2, 0), "z": (0, 1)}[axis]
+    keep = 3 - a - b
+    matrices[..., keep, keep] = 1.0
+    matrices[..., a, a] = cos
+    matrices[..., a, b] = sin
+    matrices[..., b, a] = -sin
+    matrices[..., b, b] = cos
+    return matrices
+
+
+''' Euler rotation in the given rotation order, the first axis in the order is applied first '''
+def eulerMatrices(rx, ry, rz, order="xyz"):
+    angles = {"x": rx, "y": ry, "z": rz}
+    result = rotationMatrices(order[0], angles[order[0]])
+    for axis in order[1:]:
+        result = result @ rotationMatrices(axis, angles[axis])
+    return result
+
+
+def translationMatrices(positions):
+    positions = np.asarray(positions, dtype=np.float64)
+    matrices = np.zeros(positions.shape[:-1] + (4, 4))
+    matrices[..., 0, 0] = matrices[..., 1, 1] = matrices[..., 2, 2] = matrices[..., 3, 3] = 1.0
+    matrices[..., 3, :3] = positions
+    return matrices
+
+
+def scaleMatrices(scales):
+    scales = np.asarray(scales, dtype=np.float64)
+    matrices = np.zeros(scales.shape[:-1] + (4, 4))
+    matrices[..., 0, 0] = scales[..., 0]
+    matrices[..., 1, 1] = scales[..., 1]
+    matrices[..., 2, 2] = scales[..., 2]
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+''' Scale, then rotate, then translate, the same order as a Maya transform node '''
+def composeMatrices(positions, rotations, scales=None):
+    matrices = rotations @ translationMatrices(positions)
+    if scales is not None:
+        matrices = scaleMatrices(scales) @ matrices
+    return matrices
+
+
+''' Euler angles in degrees (rotation order xyz) from rotation matrices, any scale is removed first '''
+def matrixToEuler(matrices):
+    rows = np.asarray(matrices, dtype=np.float64)[..., :3, :3]
+    rows = rows / np.linalg.norm(rows, axis=-1, keepdims=True)
+
+    ry = np.arcsin(np.clip(-rows[..., 0, 2], -1.0, 1.0))
+    rx = np.arctan2(rows[..., 1, 2], rows[..., 2, 2])
+    rz = np.arctan2(rows[..., 0, 1], rows[..., 0, 0])
+    return np.degrees(np.stack([rx, ry, rz], axis=-1))
+
+
+''' Transform (N, 3) points by a single matrix, or (M, N, 3) points by (M, 4, 4) matrices '''
+def transformPoints(points, matrices):
+    points = np.asarray(points, dtype=np.float64)
+    return points @ matrices[..., :3, :3] + matrices[..., 3:4, :3]
+
+
+''' PRIMITIVES '''
+
+''' Cylinder with the same topology as polyCylinder: one ring of subdivsAxis vertices per edge loop
+from the bottom up, then the bottom and top cap centers. Side faces come first, then the bottom
+and top cap triangles. The base sits at y = base, so base=0 puts the pivot at the bottom. '''
+def cylinderMesh(radius, height, subdivsHeight, subdivsAxis=20, base=None, vRepeat=4.0):
+    subdivsHeight = max(1, int(subdivsHeight))
+    if base is None:
+        base = -height * 0.5
+
+    loops = subdivsHeight + 1
+    angles = np.arange(subdivsAxis) * (2.0 * np.pi / subdivsAxis)
+    heights = base + np.linspace(0.0, height, loops)
+
+    ring = np.stack([np.cos(angles) * radius, np.zeros(subdivsAxis), -np.sin(angles) * radius], axis=1)
+    sidePoints = np.repeat(ring[None], loops, axis=0)
+    sidePoints[:, :, 1] = heights[:, None]
+    capPoints = np.array([[0.0, base, 0.0], [0.0, base + height, 0.0]])
+    points = np.concatenate([sidePoints.reshape(-1, 3), capPoints])
+
+    # Side quads
+    i, j = np.meshgrid(np.arange(subdivsHeight), np.arange(subdivsAxis), indexing="ij")
+    jNext = (j + 1) % subdivsAxis
+    sideFaces = np.stack([i * subdivsAxis + j, i * subdivsAxis + jNext,
+                          (i + 1) * subdivsAxis + jNext, (i + 1) * subdivsAxis + j], axis=-1).reshape(-1, 4)
+
+    # Cap triangles, wound so the bottom faces down and the top faces up
+    bottomCenter = loops * subdivsAxis
+    topRing = subdivsHeight * subdivsAxis
+    k = np.arange(subdivsAxis)
+    kNext = (k + 1) % subdivsAxis
+    bottomFaces = np.stack([np.full(subdivsAxis, bottomCenter), kNext, k], axis=1)
+    topFaces = np.stack([np.full(subdivsAxis, bottomCenter + 1), topRing + k, topRing + kNext], axis=1)
+
+    # Side uvs get an extra seam column so the texture does not wrap backwards
+    u = np.arange(subdivsAxis + 1) / subdivsAxis
+    v = np.linspace(0.0, vRepeat, loops)
+    sideUvs = np.stack(np.meshgrid(u, v, indexing="xy"), axis=-1).reshape(-1, 2)
+    capUvs = np.stack([0.5 + 0.5 * np.cos(angles), 0.5 - 0.5 * np.sin(angles)], axis=1)
+    uvs = np.concatenate([sideUvs, capUvs, [[0.5, 0.5]]])
+
+    uvRow = subdivsAxis + 1
+    sideUvIds = np.stack([i * uvRow + j, i * uvRow + j + 1, (i + 1) * uvRow + j + 1, (i + 1) * uvRow + j], axis=-1).reshape(-1, 4)
+    capStart = uvRow * loops
+    capCenter = capStart + subdivsAxis
+    bottomUvIds = np.stack([np.full(subdivsAxis, capCenter), capStart + kNext, capStart + k], axis=1)
+    topUvIds = np.stack([np.full(subdivsAxis, capCenter), capStart + k, capStart + kNext], axis=1)
+
+    faceCounts = np.concatenate([np.full(len(sideFaces), 4), np.full(2 * subdivsAxis, 3)])
+    faceConnects = np.concatenate([sideFaces.ravel(), bottomFaces.ravel(), topFaces.ravel()])
+    uvIds = np.concatenate([sideUvIds.ravel(), bottomUvIds.ravel(), topUvIds.ravel()])
+    return MeshData(points, faceCounts, faceConnects, uvs, uvIds)
+
+
+''' Single quad in the XZ plane facing up, like polyPlane with sw=1 and sh=1 '''
+def planeMesh(width, height):
+    halfW = width * 0.5
+    halfH = height * 0.5
+    points = [[-halfW, 0.0, halfH], [halfW, 0.0, halfH], [-halfW, 0.0, -halfH], [halfW, 0.0, -halfH]]
+    uvs = [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]
+    return MeshData(points, [4], [0, 1, 3, 2], uvs, [0, 1, 3, 2])
+
+
+''' Copy the mesh once per matrix, all copies transformed in one batched product '''
+def instanceMesh(mesh, matrices):
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    count = len(matrices)
+
+    points = transformPoints(np.broadcast_to(mesh.points, (count,) + mesh.points.shape), matrices)
+    vertexOffsets = np.arange(count)[:, None] * mesh.numVertices()
+    uvOffsets = np.arange(count)[:, None] * len(mesh.uvs)
+
+    return MeshData(points.reshape(-1, 3),
+                    np.tile(mesh.faceCounts, count),
+                    (mesh.faceConnects[None] + vertexOffsets).ravel(),
+                    np.tile(mesh.uvs, (count, 1)),
+                    (mesh.uvIds[None] + uvOffsets).ravel())
+
+
+''' Merge several meshes into one, offsetting the vertex and uv indices '''
+def combineMeshes(meshes):
+    meshes = list(meshes)
+    if not meshes:
+        return MeshData(np.zeros((0, 3)), [], [], np.zeros((0, 2)), [])
+
+    vertexOffsets = np.cumsum([0] + [m.numVertices() for m in meshes[:-1]])
+    uvOffsets = np.cumsum([0] + [len(m.uvs) for m in meshes[:-1]])
+
+    return MeshData(np.concatenate([m.points for m in meshes]),
+                    np.concatenate([m.faceCounts for m in meshes]),
+                    np.concatenate([m.faceConnects + o for m, o in zip(meshes, vertexOffsets)]),
+                    np.concatenate([m.uvs for m in meshes]),
+                    np.concatenate([m.uvIds + o for m, o in zip(meshes, uvOffsets)]))
+
+
+''' SOFT DEFORMATION
+Falloff weighted move, rotate and scale of a few selected vertices, the same kind of deformation
+as moving a face with soft selection on, but computed directly on the point array.
+Doesn't depend on the scene selection or the soft select settings, so the result is always the same. '''
+
+''' Weight per point, 1 on the selected vertices fading smoothly to 0 at falloffDistance from them '''
+def falloffWeights(points, selected, falloffDistance):
+    points = np.asarray(points, dtype=np.float64)
+    distances = np.linalg.norm(points[:, None, :] - points[selected][None, :, :], axis=-1).min(axis=1)
+    t = np.clip(distances / falloffDistance, 0.0, 1.0)
+    return 1.0 - t * t * (3.0 - 2.0 * t)
+
+
+''' Move, then rotate (degrees) and scale around the center of the selected vertices, every point
+by its falloff weight. A rotation around the length of the mesh twists it, around another axis it
+bends, and scaling tapers it. Returns the new (N, 3) points. '''
+def falloffDeform(points, selected, falloffDistance, translate=(0, 0, 0), rotate=(0, 0, 0), scale=(1, 1, 1)):
+    points = np.array(points, dtype=np.float64)
+    weights = falloffWeights(points, selected, falloffDistance)[:, None]
+
+    points += weights * np.asarray(translate, dtype=np.float64)
+
+    selectedPoints = points[selected]
+    pivot = (selectedPoints.min(axis=0) + selectedPoints.max(axis=0)) * 0.5
+
+    rotate = np.asarray(rotate, dtype=np.float64)
+    if rotate.any():
+        angles = weights * rotate
+        rotations = eulerMatrices(angles[:, 0], angles[:, 1], angles[:, 2])[:, :3, :3]
+        points = pivot + np.einsum("ni,nij->nj", points - pivot, rotations)
+
+    scale = np.asarray(scale, dtype=np.float64)
+    points = pivot + (points - pivot) * (1.0 + weights * (scale - 1.0))
+
+    return points
+
+
+''' Vertex indices of a face, by default the last one (the top cap on a cylinder) '''
+def faceVertices(mesh, faceIndex=-1):
+    faceIndex = faceIndex % mesh.numFaces()
+    start = int(np.sum(mesh.faceCounts[:faceIndex]))
+    return mesh.faceConnects[start:start + mesh.faceCounts[faceIndex]]
+
+
+''' Bend the top of the branch to a side and taper it '''
+def deformBranch(points, topFace, rng):
+    randomX = rng.uniform(0, 6)
+    randomY = rng.uniform(0, 6)
+    randomZ = rng.uniform(0, 6)
+    randomRotation = rng.uniform(30, 90)
+
+    return falloffDeform(points, topFace, 15, translate=(randomX, randomX, randomZ),
+                         rotate=(0, 0, randomRotation), scale=(0.4, 1, 0.4))
+
+
+''' Curl the top of a twig upwards and taper it, points in world space '''
+def deformTwig(points, topFace, rng):
+    deformFactor = rng.uniform(0.2, 0.5)
+    scaleFactor = rng.uniform(0.3, 0.5)
+
+    return falloffDeform(points, topFace, 7.5, translate=(0, deformFactor, deformFactor),
+                         rotate=(0, 0, rng.uniform(0, 75)), scale=(scaleFactor, 1, scaleFactor))
+
+
+''' TWIG LAYOUT
+Lays out all twigs on a branch in one batch, before any of them is built.
+branchCenters are the edge loop centers of the branch, minY and maxY its height: twigs get thinner
+higher up on the branch. Returns a dict of arrays with one entry per twig (the edge loop it starts on,
+its position, length, subdivs, radius, yaw and world rotation matrix), or None if the branch has
+nowhere to put a twig. '''
+def twigLayout(branchCenters, count, minY, maxY, rng=None):
+    rng = makeRng(rng)
+    branchCenters = np.asarray(branchCenters, dtype=np.float64).reshape(-1, 3)
+
+    # Twigs are not created at the bottom and top edge loops
+    subdivsHeight = len(branchCenters) - 1
+    weights = twigAnchorWeights(subdivsHeight)
+    if weights is None:
+        return None
+
+    anchors = np.minimum(rng.choice(subdivsHeight, size=count, p=weights), subdivsHeight - 2)
+    positions = branchCenters[anchors]
+
+    # Random length, subdivs following the length
+    lengths = rng.uniform(4, 8, count)
+    subdivs = np.maximum(1, rng.uniform(np.floor(lengths) - 1, np.floor(lengths)).astype(int))
+
+    # Thinner twigs higher up on the branch
+    lerp = np.maximum((maxY - positions[:, 1]) / (maxY - minY), 0.2)
+    radii = 0.5 * lerp
+
+    # Tilt outwards and spin around the branch
+    yaws = rng.uniform(0, 359, count)
+    rotations = eulerMatrices(0, yaws, 30, order="zxy")
+
+    return {"anchors": anchors, "positions": positions, "lengths": lengths, "subdivs": subdivs,
+            "radii": radii, "yaws": yaws, "rotations": rotations}
+
+
+''' LEAF PLACEMENT
+Computes every leaf transform for every twig in one batched pass.
+twigPoints is a list with the valid center points of each twig (the bottom edge loop left out),
+twigRadii and twigRotations hold the radius and the (4, 4) world rotation of each twig.
+With a spacing, leaves are placed as blue noise: candidatesPerLeaf times as many spots are drawn
+and only the ones at least spacing apart are kept, up to leafCount per twig. Twigs can end up with
+fewer leaves that way, but without leaves piled on top of each other.
+Returns the leaf positions and scales as (N, 3) arrays, the rotation matrices as (N, 4, 4)
+and the index of the twig each leaf belongs to, in order of the twigs. '''
+def leafTransforms(twigPoints, twigRadii, twigRotations, leafCount, rng=None, spacing=None, candidatesPerLeaf=4):
+    rng = makeRng(rng)
+
+    twigCount = len(twigPoints)
+    total = twigCount * leafCount
+    twigIndex = np.repeat(np.arange(twigCount), leafCount)
+    if not total:
+        return np.zeros((0, 3)), np.zeros((0, 4, 4)), np.zeros((0, 3)), twigIndex
+
+    if spacing:
+        candidateTwigs = np.repeat(np.arange(twigCount), leafCount * candidatesPerLeaf)
+        candidates = leafPositions(twigPoints, twigRadii, candidateTwigs, rng)
+        keep = poissonDiskSample(candidates, spacing, candidateTwigs, leafCount, rng)
+
+        positions = candidates[keep]
+        twigIndex = candidateTwigs[keep]
+        total = len(keep)
+    else:
+        positions = leafPositions(twigPoints, twigRadii, twigIndex, rng)
+
+    # Align with the twig, then add variation
+    localRotations = eulerMatrices(rng.uniform(30, 60, total), rng.uniform(60, 120, total), np.zeros(total))
+    rotations = localRotations @ np.asarray(twigRotations, dtype=np.float64).reshape(-1, 4, 4)[twigIndex]
+
+    # Leaf length varies, the width stays the same
+    scales = np.ones((total, 3))
+    scales[:, 2] = rng.uniform(1.0, 1.5, total)
+
+    return positions, rotations, scales, twigIndex
+
+
+''' A random spot for every leaf around a random center point of its twig, twigIndex holds
+the twig of every leaf. Returns the (N, 3) positions. '''
+def leafPositions(twigPoints, twigRadii, twigIndex, rng):
+    total = len(twigIndex)
+
+    # Pick a random center point per leaf out of its own twig's points
+    pointCounts = np.array([len(p) for p in twigPoints])
+    pointOffsets = np.concatenate([[0], np.cumsum(pointCounts)[:-1]])
+    allPoints = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 3) for p in twigPoints])
+    pointIndex = pointOffsets[twigIndex] + (rng.random(total) * pointCounts[twigIndex]).astype(int)
+
+    # Random offset around the twig, relative to its radius
+    radii = np.asarray(twigRadii, dtype=np.float64)[twigIndex]
+    offset = rng.uniform(1.25, 1.75, total)
+    offsetXZ = rng.uniform(-1.0, 1.0, total) * radii * offset
+    offsetY = rng.uniform(0.6, 1.0, total) * radii
+    return allPoints[pointIndex] + np.stack([offsetXZ, offsetY, offsetXZ], axis=1)
+
+
+''' BLUE NOISE
+Goes over the candidate points in a random order and keeps every one that is at least minDistance
+away from all points kept before it (and from the existing points), dart throwing style.
+The kept points are looked up in a uniform grid with cells of minDistance, so a candidate only
+has to be checked against the points in its own and the 26 cells around it, O(n) expected time.
+groups and groupLimit optionally cap the amount of kept points per group (leaves per twig).
+Returns the indices of the kept candidates, sorted. '''
+def poissonDiskSample(points, minDistance, groups=None, groupLimit=None, rng=None, existing=None):
+    rng = makeRng(rng)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    minDistanceSq = minDistance * minDistance
+    if not len(points):
+        return np.zeros(0, dtype=np.int64)
+
+    # Grid cell of every point as a single int key, so the neighbour cells are a key plus an offset.
+    # Computed in one go, the loop below works on plain floats and ints.
+    existing = np.zeros((0, 3)) if existing is None else np.asarray(existing, dtype=np.float64).reshape(-1, 3)
+    allCells = np.floor(np.concatenate([points, existing]) / minDistance).astype(np.int64)
+    allCells -= allCells.min(axis=0) - 1
+    size = allCells.max(axis=0) + 2
+    strides = [int(size[1] * size[2]), int(size[2]), 1]
+    keys = (allCells @ np.array(strides)).tolist()
+    neighbours = [x * strides[0] + y * strides[1] + z for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+
+    coordinates = points.tolist()
+    grid = {}
+    for key, point in zip(keys[len(points):], existing.tolist()):
+        grid.setdefault(key, []).append(point)
+
+    groups = np.asarray(groups).tolist() if groups is not None else None
+    groupCounts = {}
+    kept = []
+    for index in rng.permutation(len(points)).tolist():
+        group = groups[index] if groups is not None else None
+        if groupLimit is not None and groupCounts.get(group, 0) >= groupLimit:
+            continue
+
+        px, py, pz = coordinates[index]
+        key = keys[index]
+        tooClose = False
+        for offset in neighbours:
+            for ox, oy, oz in grid.get(key + offset, ()):
+                if (px - ox) ** 2 + (py - oy) ** 2 + (pz - oz) ** 2 < minDistanceSq:
+                    tooClose = True
+                    break
+            if tooClose:
+                break
+        if tooClose:
+            continue
+
+        grid.setdefault(key, []).append(coordinates[index])
+        groupCounts[group] = groupCounts.get(group, 0) + 1
+        kept.append(index)
+
+    return np.sort(np.asarray(kept, dtype=np.int64))
+
+
+''' TREE PARTS
+The full detail tree before it is merged into meshes: every cylinder (the branch first, then the
+twigs) with its subdivs on the height, the size of every twig and the transform of every leaf.
+generateTreeGeometry merges the parts as they are, generateTreeLods reduces them first. '''
+def generateTreeParts(branchHeight, subdivsHeight, twigCount, leafCount, subdivsAxis=20, rng=None, leafSpacing=None):
+    rng = makeRng(rng)
+
+    # BRANCH
+    branchRadius = rng.uniform(0.6, 0.9)
+    branch = cylinderMesh(branchRadius, branchHeight, subdivsHeight, subdivsAxis)
+    branch.points = deformBranch(branch.points, faceVertices(branch), rng)
+    branchCenters = loopCenters(branch.points, subdivsAxis, subdivsHeight + 1)
+
+    minY = branch.points[:, 1].min()
+    maxY = branch.points[:, 1].max()
+
+    # All twigs are laid out in one batch, then built one by one
+    layout = twigLayout(branchCenters, twigCount, minY, maxY, rng)
+    if layout is None:
+        twigCount = 0
+
+    cylinders = [branch]
+    cylinderSubdivs = [max(1, int(subdivsHeight))]
+    twigPoints = []
+    twigRadii = []
+    twigRotations = []
+
+    for x in range(twigCount):
+        twigSubdivs = int(layout["subdivs"][x])
+        rotation = layout["rotations"][x]
+
+        # Pivot at the bottom, then tilt, spin and move it to its edge loop
+        twig = cylinderMesh(layout["radii"][x], layout["lengths"][x], twigSubdivs, subdivsAxis, base=0.0)
+        twig.points = transformPoints(twig.points, rotation @ translationMatrices(layout["positions"][x]))
+        twig.points = deformTwig(twig.points, faceVertices(twig), rng)
+        cylinders.append(twig)
+        cylinderSubdivs.append(twigSubdivs)
+
+        # Leaves go on every edge loop except the bottom one
+        twigPoints.append(loopCenters(twig.points, subdivsAxis, twigSubdivs + 1)[1:])
+        twigRadii.append(layout["radii"][x])
+        twigRotations.append(rotation)
+
+    # LEAVES, all of them placed in one batch on a unit length leaf
+    positions, rotations, scales, twigIndex = leafTransforms(twigPoints, twigRadii, twigRotations, leafCount, rng, leafSpacing)
+
+    return {"cylinders": cylinders, "cylinderSubdivs": cylinderSubdivs, "subdivsAxis": subdivsAxis,
+            "twigSizes": layout["radii"] * layout["lengths"] if twigCount else np.zeros(0),
+            "leafPositions": positions, "leafRotations": rotations, "leafScales": scales, "leafTwigs": twigIndex}
+
+
+''' TREE ENGINE
+Builds the same branch, twigs and leaves as createBranch, createTwig and createLeaves,
+but as arrays instead of scene nodes. Returns a dict with one MeshData per material:
+"wood" for the branch and twigs and "leaf" for all the leaves. '''
+def generateTreeGeometry(branchHeight, subdivsHeight, twigCount, leafCount, subdivsAxis=20, rng=None, leafSpacing=None):
+    return treeFromParts(generateTreeParts(branchHeight, subdivsHeight, twigCount, leafCount, subdivsAxis, rng, leafSpacing))
+
+
+''' Merge the parts of generateTreeParts into one wood and one leaf mesh '''
+def treeFromParts(parts):
+    leafMatrices = composeMatrices(parts["leafPositions"], parts["leafRotations"], parts["leafScales"])
+    return {"wood": combineMeshes(parts["cylinders"]), "leaf": instanceMesh(planeMesh(0.75, 1.0), leafMatrices)}
+
+
+''' LEVELS OF DETAIL
+Every level is made from the same full detail parts, so all levels of a seeded tree match.
+Level 0 is the full tree, every next level keeps every other edge loop and every other vertex
+around the cylinders, drops the smallest part of the twigs and merges more leaves into one card. '''
+def lodSettings(level):
+    return {"loopStep": 2 ** level, "axisStep": 2 ** level, "twigFraction": 0.7 ** level, "leavesPerCard": 4 ** level}
+
+
+''' Lower resolution copy of a cylinder made by cylinderMesh, keeping every loopStep-th edge loop
+(and always the top one) and every axisStep-th vertex around. The kept vertices don't move,
+so a deformed cylinder keeps its shape. '''
+def reduceCylinder(mesh, subdivsHeight, subdivsAxis, loopStep=1, axisStep=1):
+    loops = subdivsHeight + 1
+    keepLoops = np.arange(0, loops, max(1, loopStep))
+    if keepLoops[-1] != loops - 1:
+        keepLoops = np.append(keepLoops, loops - 1)
+
+    reducedAxis = max(3, subdivsAxis // max(1, axisStep))
+    keepAxis = np.round(np.linspace(0, subdivsAxis, reducedAxis, endpoint=False)).astype(int)
+
+    # Same topology and uvs as a fresh cylinder of the reduced size, with the kept points
+    reduced = cylinderMesh(1.0, 1.0, len(keepLoops) - 1, reducedAxis)
+    rings = mesh.points[:loops * subdivsAxis].reshape(loops, subdivsAxis, 3)
+    reduced.points = np.concatenate([rings[keepLoops][:, keepAxis].reshape(-1, 3), mesh.points[-2:]])
+    return reduced
+
+
+''' Merge groups of up to leavesPerCard leaves of the same twig into one bigger leaf card.
+The leaves of a twig have to be next to each other, the way leafTransforms returns them.
+A card sits in the middle of its leaves, turned like the first of them and covering about
+the same area. Returns the (N, 4, 4) matrices of the cards. '''
+def leafCards(positions, rotations, scales, leafTwigs, leavesPerCard=1):
+    if leavesPerCard <= 1 or not len(positions):
+        return composeMatrices(positions, rotations, scales)
+
+    # Index of every leaf within its own twig, then a group per leavesPerCard of them
+    firstLeaf = np.searchsorted(leafTwigs, leafTwigs)
+    withinTwig = np.arange(len(leafTwigs)) - firstLeaf
+    groups = leafTwigs * (withinTwig.max() + 1) + withinTwig // leavesPerCard
+    _, firstInGroup, group, counts = np.unique(groups, return_index=True, return_inverse=True, return_counts=True)
+
+    centers = np.stack([np.bincount(group, positions[:, axis]) for axis in range(3)], axis=1) / counts[:, None]
+
+    # A card is flat on y, so only the width and length grow with the amount of leaves
+    cardScales = scales[firstInGroup].copy()
+    cardScales[:, [0, 2]] *= np.sqrt(counts)[:, None]
+
+    return composeMatrices(centers, rotations[firstInGroup], cardScales)
+
+
+''' Generate a tree once and reduce it to levels of detail, level 0 being the full tree.
+Returns a list with a dict of MeshData per level, the same as generateTreeGeometry. '''
+def generateTreeLods(branchHeight, subdivsHeight, twigCount, leafCount, levels=3, subdivsAxis=20, rng=None, leafSpacing=None):
+    parts = generateTreeParts(branchHeight, subdivsHeight, twigCount, leafCount, subdivsAxis, rng, leafSpacing)
+    twigSizes = parts["twigSizes"]
+
+    lods = []
+    for level in range(levels):
+        settings = lodSettings(level)
+
+        # Keep the biggest twigs, and the leaves on them
+        keepCount = int(np.ceil(len(twigSizes) * settings["twigFraction"]))
+        keepTwigs = np.zeros(len(twigSizes), dtype=bool)
+        keepTwigs[np.argsort(-twigSizes, kind="stable")[:keepCount]] = True
+
+        wood = []
+        for index, (mesh, subdivs) in enumerate(zip(parts["cylinders"], parts["cylinderSubdivs"])):
+            # Index 0 is the branch, which is always kept
+            if index == 0 or keepTwigs[index - 1]:
+                wood.append(reduceCylinder(mesh, subdivs, subdivsAxis, settings["loopStep"], settings["axisStep"]))
+
+        keepLeaves = keepTwigs[parts["leafTwigs"]]
+        cards = leafCards(parts["leafPositions"][keepLeaves], parts["leafRotations"][keepLeaves],
+                          parts["leafScales"][keepLeaves], parts["leafTwigs"][keepLeaves], settings["leavesPerCard"])
+
+        lods.append({"wood": combineMeshes(wood), "leaf": instanceMesh(planeMesh(0.75, 1.0), cards)})
+    return lods
+
+
+''' Triangle count of every part of every level, as a list of dicts '''
+def lodTriangleCounts(lods):
+    return [{key: mesh.numTriangles() for key, mesh in lod.items()} for lod in lods]
+
+
+''' RECURSIVE TREE ENGINE
+Any amount of generations instead of the fixed branch, twig and leaf levels. Every generation grows
+"count" children out of the edge loops of every segment of the generation before it, picked the same
+way twigs are picked on the branch. Lengths and radii are relative to the parent, except for the
+trunk (the first generation) where they are absolute. Tilt is the angle away from the parent. '''
+defaultGenerations = [
+    {"count": 1, "length": (12.0, 18.0), "radius": (0.6, 0.9), "tilt": (0.0, 5.0), "subdivsHeight": 10, "subdivsAxis": 12},
+    {"count": 8, "length": (0.3, 0.5), "radius": (0.4, 0.6), "tilt": (30.0, 60.0), "subdivsHeight": 6, "subdivsAxis": 8},
+    {"count": 6, "length": (0.4, 0.6), "radius": (0.4, 0.6), "tilt": (30.0, 60.0), "subdivsHeight": 4, "subdivsAxis": 6},
+    {"count": 5, "length": (0.4, 0.6), "radius": (0.5, 0.7), "tilt": (20.0, 50.0), "subdivsHeight": 3, "subdivsAxis": 5},
+]
+
+
+''' Generation settings for a tree of a certain depth, the last default generation is repeated
+for anything deeper than the defaults '''
+def recursiveGenerations(depth):
+    return [defaultGenerations[min(x, len(defaultGenerations) - 1)] for x in range(depth)]
+
+
+''' Build a tree of any depth. All segments of a generation are laid out at once: every segment has
+a (4, 4) world frame (rotation and position, no scale) and the frames of the children are composed
+with the frames of their parents in one stacked matrix product. The segment meshes are instances of
+one unit cylinder per generation, scaled to their length and radius.
+The segments of the last generation get leafCount leaves each.
+Returns a dict with one MeshData per material, the same as generateTreeGeometry. '''
+def generateRecursiveTree(depth=4, leafCount=10, generations=None, rng=None):
+    rng = makeRng(rng)
+    generations = generations or recursiveGenerations(depth)
+
+    woodMeshes = []
+    frames = lengths = radii = centers = None
+
+    for level, generation in enumerate(generations):
+        count = generation["count"]
+        subdivsHeight = max(1, int(generation["subdivsHeight"]))
+
+        if frames is None:
+            # TRUNK, grows up from the origin
+            total = count
+            lengths = rng.uniform(*generation["length"], total)
+            radii = rng.uniform(*generation["radius"], total)
+            localAnchors = np.zeros((total, 3))
+            parentFrames = identityMatrices(total)
+        else:
+            parentSubdivs = len(centers) - 1
+            weights = twigAnchorWeights(parentSubdivs)
+            if weights is None:
+                break
+
+            # Children of every parent, picked on the parent's edge loops like twigs on the branch
+            total = len(frames) * count
+            parentIndex = np.repeat(np.arange(len(frames)), count)
+            loops = np.minimum(rng.choice(parentSubdivs, size=total, p=weights), parentSubdivs - 2)
+
+            parentLengths = lengths[parentIndex]
+            parentRadii = radii[parentIndex]
+            localAnchors = centers[loops] * np.stack([parentRadii, parentLengths, parentRadii], axis=1)
+            parentFrames = frames[parentIndex]
+
+            # Thinner children higher up on their parent
+            lerp = np.maximum(1.0 - loops / float(parentSubdivs), 0.2)
+            lengths = parentLengths * rng.uniform(*generation["length"], total)
+            radii = parentRadii * rng.uniform(*generation["radius"], total) * lerp
+
+        # Tilt away from the parent, spin around it, then move to the edge loop on the parent
+        rotations = eulerMatrices(0, rng.uniform(0, 360, total), rng.uniform(*generation["tilt"], total), order="zxy")
+        frames = rotations @ translationMatrices(localAnchors) @ parentFrames
+
+        # Unit cylinder with its pivot at the bottom, its loop centers are where the children go
+        unit = cylinderMesh(1.0, 1.0, subdivsHeight, generation["subdivsAxis"], base=0.0, vRepeat=1.0)
+        centers = loopCenters(unit.points, generation["subdivsAxis"], subdivsHeight + 1)
+
+        scales = np.stack([radii, lengths, radii], axis=1)
+        woodMeshes.append(instanceMesh(unit, scaleMatrices(scales) @ frames))
+
+    # LEAVES on every edge loop of the last generation except the bottom one
+    leafPoints = transformPoints(centers[None, 1:] * scales[:, None, :], frames)
+    leafRotations = frames.copy()
+    leafRotations[:, 3, :3] = 0.0
+    positions, rotations, leafScales, _ = leafTransforms(leafPoints, radii, leafRotations, leafCount, rng)
+    leaves = instanceMesh(planeMesh(0.75, 1.0), composeMatrices(positions, rotations, leafScales))
+
+    return {"wood": combineMeshes(woodMeshes), "leaf": leaves}
+
+
+''' Flatten a dict of meshes into named arrays ("wood_points", "leaf_faceCounts", ...) for saving '''
+def treeToArrays(tree):
+    arrays = {}
+    for key, mesh in tree.items():
+        for attr in MeshData.__slots__:
+            arrays[key + "_" + attr] = getattr(mesh, attr)
+    return arrays
+
+
+''' The other way around, arrays can also be a loaded .npz file or memory-mapped arrays '''
+def treeFromArrays(arrays):
+    keys = sorted(set(name.rsplit("_", 1)[0] for name in arrays.keys()))
+    return {key: MeshData(*[arrays[key + "_" + attr] for attr in MeshData.__slots__]) for key in keys}
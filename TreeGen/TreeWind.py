@@ -0,0 +1,141 @@
+import os
+import shutil
+
+import numpy as np
+
+import TreeGeometry as geo
+
+# Baked wind animation for trees from the NumPy engine.
+# Every vertex gets a weight and a phase per level of the tree (branch, twig and leaf):
+#   branch - the whole tree sways, more the higher up it is
+#   twig   - every twig sways on top of that with its own phase, more towards its tip
+#   leaf   - every leaf flutters along its normal with its own phase, pivoting on its stem
+# The offsets of all vertices for all frames are computed as arrays and written to a
+# memory-mapped point cache, one .npy file per mesh with the (frames, vertices, 3) positions.
+# Playing it back is reading one frame out of the file and setting the points of the mesh.
+
+# Defaults for bakeWind, one value per level for the strength (offset in units) and frequency (hertz)
+defaultWind = {"direction": (1.0, 0.0, 0.0), "strength": (0.6, 0.25, 0.08), "frequency": (0.3, 0.9, 2.5), "lean": 0.3}
+
+
+''' Branch weight of a point, 0 at the bottom of the branch to 1 at the top, eased in '''
+def branchWeights(points, minY, maxY):
+    return np.clip((points[..., 1] - minY) / (maxY - minY), 0.0, 1.0) ** 2
+
+
+''' WIND RIG
+Weights (V, 3) and phases (V, 3) of every vertex on the three levels, and the direction the
+leaf level moves in (V, 3), for the wood and leaf mesh the parts of generateTreeParts merge into.
+Twigs and leaves take the branch sway of the spot they grow on, leaves also that of their twig. '''
+def windRig(parts, rng=None):
+    rng = geo.makeRng(rng)
+    subdivsAxis = parts["subdivsAxis"]
+
+    branch = parts["cylinders"][0]
+    minY = branch.points[:, 1].min()
+    maxY = branch.points[:, 1].max()
+
+    twigs = parts["cylinders"][1:]
+    twigPhases = rng.uniform(0.0, 2.0 * np.pi, len(twigs))
+
+    # Base and length of every twig, from its bottom and top edge loop
+    twigBases = np.zeros((len(twigs), 3))
+    twigLengths = np.ones(len(twigs))
+    for index, (twig, subdivs) in enumerate(zip(twigs, parts["cylinderSubdivs"][1:])):
+        centers = geo.loopCenters(twig.points, subdivsAxis, subdivs + 1)
+        twigBases[index] = centers[0]
+        twigLengths[index] = max(np.linalg.norm(centers[-1] - centers[0]), 1e-6)
+
+    # WOOD, the branch first and then every twig, the same order as combineMeshes
+    woodWeights = [np.stack([branchWeights(branch.points, minY, maxY), np.zeros(branch.numVertices()),
+                             np.zeros(branch.numVertices())], axis=1)]
+    woodPhases = [np.zeros((branch.numVertices(), 3))]
+    for index, twig in enumerate(twigs):
+        count = twig.numVertices()
+        distance = np.linalg.norm(twig.points - twigBases[index], axis=1) / twigLengths[index]
+        woodWeights.append(np.stack([np.full(count, branchWeights(twigBases[index], minY, maxY)),
+                                     np.clip(distance, 0.0, 1.0) ** 2, np.zeros(count)], axis=1))
+        woodPhases.append(np.tile([0.0, twigPhases[index], 0.0], (count, 1)))
+
+    woodWeights = np.concatenate(woodWeights)
+    woodPhases = np.concatenate(woodPhases)
+    woodDirections = np.zeros((len(woodWeights), 3))
+
+    # LEAVES, 4 vertices per leaf in the order of instanceMesh
+    leafTwigs = parts["leafTwigs"]
+    leafCount = len(leafTwigs)
+    positions = parts["leafPositions"]
+
+    twigWeight = np.linalg.norm(positions - twigBases[leafTwigs], axis=1) / twigLengths[leafTwigs] if leafCount else np.zeros(0)
+    leafWeights = np.stack([branchWeights(twigBases[leafTwigs], minY, maxY), np.clip(twigWeight, 0.0, 1.0) ** 2,
+                            np.ones(leafCount)], axis=1)
+    leafPhases = np.stack([np.zeros(leafCount), twigPhases[leafTwigs], rng.uniform(0.0, 2.0 * np.pi, leafCount)], axis=1)
+
+    # A leaf flutters around its stem at the +z end, the far end moves the most
+    stem = 0.5 - geo.planeMesh(0.75, 1.0).points[:, 2]
+    leafWeights = np.repeat(leafWeights, 4, axis=0)
+    leafWeights[:, 2] = np.tile(stem, leafCount)
+    leafPhases = np.repeat(leafPhases, 4, axis=0)
+    leafDirections = np.repeat(parts["leafRotations"][:, 1, :3], 4, axis=0)
+
+    return {"wood": (woodWeights, woodPhases, woodDirections), "leaf": (leafWeights, leafPhases, leafDirections)}
+
+
+''' Offsets (T, V, 3) of every vertex at the given times in seconds, for the weights, phases and
+leaf directions of one mesh out of windRig '''
+def windOffsets(times, weights, phases, directions, wind=None):
+    wind = dict(defaultWind, **(wind or {}))
+    strength = np.asarray(wind["strength"], dtype=np.float64)
+    frequency = np.asarray(wind["frequency"], dtype=np.float64)
+
+    direction = np.asarray(wind["direction"], dtype=np.float64)
+    direction = direction / np.linalg.norm(direction)
+
+    # (T, V, 3 levels), the sways lean a little along the wind instead of swinging around the rest pose
+    angles = 2.0 * np.pi * frequency * np.asarray(times, dtype=np.float64)[:, None, None] + phases[None]
+    sway = strength * weights[None] * np.sin(angles)
+    sway[..., :2] += strength[:2] * weights[None, :, :2] * wind["lean"]
+
+    return (sway[..., 0] + sway[..., 1])[..., None] * direction + sway[..., 2:3] * directions[None]
+
+
+''' Bake the wind of a tree to a cache folder with a memory-mapped .npy per mesh holding the
+(frames, vertices, 3) float32 positions. Frames are computed chunkFrames at a time, so memory stays
+the same whatever the length of the bake. Returns the meshes of the tree the cache belongs to. '''
+def bakeWind(parts, directory, frameCount, fps=24.0, wind=None, chunkFrames=24, rng=None):
+    tree = geo.treeFromParts(parts)
+    rig = windRig(parts, rng)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    for key, (weights, phases, directions) in rig.items():
+        rest = tree[key].points
+        cache = np.lib.format.open_memmap(os.path.join(directory, key + ".npy"), mode="w+", dtype=np.float32,
+                                          shape=(frameCount, len(rest), 3))
+        for start in range(0, frameCount, chunkFrames):
+            frames = np.arange(start, min(start + chunkFrames, frameCount))
+            cache[frames] = rest + windOffsets(frames / float(fps), weights, phases, directions, wind)
+        cache.flush()
+        del cache
+
+    return tree
+
+
+''' Reads a baked wind cache back, every mesh memory-mapped so only the frames that are played are read '''
+class WindCache(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meshes = {}
+        for fileName in os.listdir(directory):
+            if fileName.endswith(".npy"):
+                self.meshes[fileName[:-4]] = np.load(os.path.join(directory, fileName), mmap_mode="r")
+
+    def frameCount(self):
+        return min(len(points) for points in self.meshes.values())
+
+    ''' (V, 3) positions of a mesh on a frame, looping around past the end of the bake '''
+    def frame(self, key, index):
+        points = self.meshes[key]
+        return np.asarray(points[int(index) % len(points)])
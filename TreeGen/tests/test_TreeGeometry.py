@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The tree modules import each other by name, from the TreeGen folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TreeGeometry as geo
+
+
+''' Vertex and face count of a cylinderMesh: a ring per edge loop plus the two cap centers,
+quads around the side and a fan of triangles on each cap '''
+def cylinderCounts(subdivsHeight, subdivsAxis):
+    return (subdivsHeight + 1) * subdivsAxis + 2, subdivsHeight * subdivsAxis + 2 * subdivsAxis
+
+def meshArrays(mesh):
+    return [mesh.points, mesh.faceCounts, mesh.faceConnects, mesh.uvs, mesh.uvIds]
+
+
+@pytest.mark.parametrize("leafSpacing", [None, 0.6])
+def test_sameSeedSameTree(leafSpacing):
+    first = geo.generateTreeGeometry(15, 10, 8, 12, rng=geo.makeRng(7), leafSpacing=leafSpacing)
+    second = geo.generateTreeGeometry(15, 10, 8, 12, rng=geo.makeRng(7), leafSpacing=leafSpacing)
+
+    for key in ("wood", "leaf"):
+        for firstArray, secondArray in zip(meshArrays(first[key]), meshArrays(second[key])):
+            np.testing.assert_array_equal(firstArray, secondArray)
+
+def test_otherSeedOtherTree():
+    first = geo.generateTreeGeometry(15, 10, 8, 12, rng=geo.makeRng(7))
+    second = geo.generateTreeGeometry(15, 10, 8, 12, rng=geo.makeRng(8))
+    assert not np.array_equal(first["wood"].points, second["wood"].points)
+
+@pytest.mark.parametrize("subdivsHeight, subdivsAxis", [(1, 3), (10, 20), (4, 8)])
+def test_cylinderCounts(subdivsHeight, subdivsAxis):
+    mesh = geo.cylinderMesh(1.0, 5.0, subdivsHeight, subdivsAxis)
+    vertexCount, faceCount = cylinderCounts(subdivsHeight, subdivsAxis)
+
+    assert mesh.numVertices() == vertexCount
+    assert mesh.numFaces() == faceCount
+    assert mesh.numTriangles() == 2 * subdivsHeight * subdivsAxis + 2 * subdivsAxis
+    assert len(mesh.faceConnects) == mesh.faceCounts.sum() == len(mesh.uvIds)
+    assert mesh.faceConnects.max() < vertexCount
+
+def test_noTwigs():
+    tree = geo.generateTreeGeometry(15, 10, 0, 12, rng=geo.makeRng(1))
+
+    # Only the branch is left, and no leaves without twigs to put them on
+    assert (tree["wood"].numVertices(), tree["wood"].numFaces()) == cylinderCounts(10, 20)
+    assert tree["leaf"].numVertices() == 0
+    assert tree["leaf"].numFaces() == 0
+
+def test_noLeaves():
+    parts = geo.generateTreeParts(15, 10, 6, 0, rng=geo.makeRng(1))
+    tree = geo.treeFromParts(parts)
+
+    # The branch and every twig, each a cylinder of its own edge loops
+    counts = [cylinderCounts(subdivs, 20) for subdivs in parts["cylinderSubdivs"]]
+    assert len(counts) == 7
+    assert tree["wood"].numVertices() == sum(vertexCount for vertexCount, _ in counts)
+    assert tree["wood"].numFaces() == sum(faceCount for _, faceCount in counts)
+    assert tree["leaf"].numFaces() == 0
+
+def test_leafCount():
+    tree = geo.generateTreeGeometry(15, 10, 6, 12, rng=geo.makeRng(1))
+
+    # Every leaf is a single quad
+    assert tree["leaf"].numFaces() == 6 * 12
+    assert tree["leaf"].numVertices() == 4 * 6 * 12